@@ -0,0 +1,86 @@
+"""Load test for the HTTP extraction API served by file_conversion_app-v3.py.
+
+Usage:
+    python file_conversion_api_load_test.py sample.pdf sample.docx --requests 200 --concurrency 8
+"""
+import argparse
+import mimetypes
+import os
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def build_multipart(paths):
+    """Encode files as a multipart/form-data body, returning (body, content type)."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for path in paths:
+        filename = os.path.basename(path)
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        with open(path, 'rb') as f:
+            data = f.read()
+        parts.append(
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode('utf-8') + data + b"\r\n"
+        )
+    body = b"".join(parts) + f"--{boundary}--\r\n".encode('utf-8')
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def send_request(url, body, content_type):
+    """POST one request and drain the streamed response; returns (latency, bytes, ok)."""
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    start_time = time.perf_counter()
+    received = 0
+    try:
+        with urllib.request.urlopen(request) as response:
+            while True:
+                chunk = response.read(65536)
+                if not chunk:
+                    break
+                received += len(chunk)
+        ok = True
+    except Exception:
+        ok = False
+    return time.perf_counter() - start_time, received, ok
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the extraction HTTP API")
+    parser.add_argument("files", nargs="+", help="Files uploaded with every request")
+    parser.add_argument("--url", default="http://127.0.0.1:7861/extract")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    body, content_type = build_multipart(args.files)
+    url = f"{args.url}?format={args.format}"
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda _: send_request(url, body, content_type), range(args.requests)))
+    wall_time = time.perf_counter() - start_time
+
+    latencies = sorted(latency for latency, _, ok in results if ok)
+    failures = sum(1 for _, _, ok in results if not ok)
+    received = sum(size for _, size, _ in results)
+
+    print(f"Requests:    {args.requests} ({failures} failed), concurrency {args.concurrency}")
+    print(f"Throughput:  {len(latencies) / wall_time:.1f} requests/s, {received / wall_time / 1024 / 1024:.2f} MiB/s out")
+    print(f"Latency p50: {percentile(latencies, 0.50) * 1000:.1f} ms")
+    print(f"Latency p99: {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,49 @@
 import gradio as gr
+import argparse
+import bisect
+import email.policy
+import errno
+import functools
+import hashlib
+import io
+import itertools
 import os
 import json
+import random
+import re
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import numpy as np
 import pandas as pd
 import logging
+import mmap
+import multiprocessing
+import sqlite3
+import struct
+import tarfile
+import tempfile
+import threading
+import time
+import tracemalloc
 import traceback
+import unicodedata
+import uuid
+import zipfile
+import zlib
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+import PyPDF2
 from PyPDF2 import PdfReader
+from PyPDF2.generic import IndirectObject, StreamObject
 from markdown2 import markdown
 from docx import Document
 from openpyxl import load_workbook
@@ -18,11 +56,155 @@ from ebooklib import epub
 from bs4 import BeautifulSoup
 import xlrd
 
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, peak RSS is not reported
+    resource = None
+
+# inotify for the watch-folder daemon (Linux only), called through libc
+try:
+    import ctypes
+    import ctypes.util
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    INOTIFY_SUPPORT = True
+except (ImportError, OSError, AttributeError):
+    INOTIFY_SUPPORT = False
+
+# Optional PDF backends
+try:
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+    PDFMINER_SUPPORT = True
+except ImportError:
+    PDFMINER_SUPPORT = False
+
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_SUPPORT = True
+except ImportError:
+    PDFIUM_SUPPORT = False
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# ======================
+# Tracing
+# ======================
+# Spans are appended as Chrome trace "complete" events to TRACE_FILE, which chrome://tracing
+# and Perfetto load directly (the closing "]" of the JSON array is optional in that format).
+# Sampling is decided once per extraction where it starts, and that decision travels with
+# the tasks sent to the pool, so a sampled file is traced in the UI process and the workers.
+TRACE_FILE = os.environ.get("EXTRACTOR_TRACE_FILE", "extraction_trace.json")
+TRACE_SAMPLE_RATE = float(os.environ.get("EXTRACTOR_TRACE_SAMPLE_RATE", 0))
+
+_trace_local = threading.local()
+_trace_fd = None
+_trace_pid = None
+_trace_lock = threading.Lock()
+
+def trace_sampled():
+    """Draw the sampling decision for a new trace"""
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+def trace_active():
+    """True inside a sampled trace on this thread; pass it on with work handed to other threads"""
+    return getattr(_trace_local, "active", False)
+
+def _open_trace_file():
+    try:
+        return os.open(TRACE_FILE, os.O_WRONLY | os.O_APPEND)
+    except FileNotFoundError:
+        pass
+    # Publish the file with its opening "[" already written, so concurrent processes never
+    # append events ahead of it
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(TRACE_FILE)), suffix=".tmp")
+    try:
+        os.write(fd, b"[\n")
+        os.link(tmp_path, TRACE_FILE)
+    except FileExistsError:
+        pass
+    finally:
+        os.close(fd)
+        os.unlink(tmp_path)
+    return os.open(TRACE_FILE, os.O_WRONLY | os.O_APPEND)
+
+def _trace_write(event):
+    global _trace_fd, _trace_pid
+    pid = os.getpid()
+    if _trace_pid != pid:  # first event in this process
+        with _trace_lock:
+            if _trace_pid != pid:
+                _trace_fd, _trace_pid = _open_trace_file(), pid
+    events = [event]
+    if getattr(_trace_local, "named_pid", None) != pid:
+        _trace_local.named_pid = pid
+        events.insert(0, {"name": "thread_name", "ph": "M", "pid": pid, "tid": event["tid"],
+                          "args": {"name": threading.current_thread().name}})
+    # One O_APPEND write per batch keeps lines from different processes whole
+    os.write(_trace_fd, "".join(json.dumps(item) + ",\n" for item in events).encode('utf-8'))
+
+def _trace_event(name, start_ns, end_ns, args=None):
+    event = {"name": name, "ph": "X", "ts": start_ns / 1000, "dur": (end_ns - start_ns) / 1000,
+             "pid": os.getpid(), "tid": threading.get_native_id()}
+    if args:
+        event["args"] = args
+    try:
+        _trace_write(event)
+    except OSError as e:
+        logger.debug(f"Could not write trace event: {str(e)}")
+
+@contextmanager
+def trace_span(name, sampled=False, **args):
+    """Record the block as a span when this thread is in a sampled trace, or start one with it
+    when `sampled` (a trace_sampled() decision), in which case nested spans are recorded too"""
+    active = trace_active()
+    if not active and not sampled:
+        yield
+        return
+    _trace_local.active = True
+    start_ns = time.time_ns()
+    try:
+        yield
+    except BaseException as e:
+        args["error"] = repr(e)
+        raise
+    finally:
+        _trace_local.active = active
+        _trace_event(name, start_ns, time.time_ns(), args)
+
+def traced(function):
+    """Span around each call of `function` made inside a sampled trace"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with trace_span(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+def trace_segments(segments):
+    """One span per page/sheet/slide covering the work to produce it, not the consumer's time
+
+    The first segment's span includes opening the document.
+    """
+    if not trace_active():
+        yield from segments
+        return
+    iterator = iter(segments)
+    while True:
+        start_ns = time.time_ns()
+        try:
+            kind, index, text = next(iterator)
+        except StopIteration:
+            return
+        _trace_event(f"{kind} {index}", start_ns, time.time_ns(), {"chars": len(text)})
+        yield kind, index, text
+
 # ======================
 # Core Extraction Logic
 # ======================
@@ -32,87 +214,796 @@ ALLOWED_EXTENSIONS = {
     '.epub'  # Added ePub support
 }
 
+# Archives are opened and their members extracted in memory
+ARCHIVE_EXTENSIONS = {'.zip', '.tar', '.tar.gz', '.tgz'}
+# Guards against archive bombs
+MAX_ARCHIVE_MEMBERS = int(os.environ.get("EXTRACTOR_MAX_ARCHIVE_MEMBERS", 1000))
+MAX_ARCHIVE_TOTAL_BYTES = int(os.environ.get("EXTRACTOR_MAX_ARCHIVE_TOTAL_BYTES", 1024 * 1024 * 1024))
+MAX_COMPRESSION_RATIO = float(os.environ.get("EXTRACTOR_MAX_COMPRESSION_RATIO", 100))
+
+MAX_WORKERS = int(os.environ.get("EXTRACTOR_MAX_WORKERS", os.cpu_count() or 2))
+
+# Fallback partitioning: None picks "fast" for files above LARGE_FILE_BYTES, "auto" otherwise
+LANGCHAIN_STRATEGY = os.environ.get("EXTRACTOR_LANGCHAIN_STRATEGY") or None
+LARGE_FILE_BYTES = int(os.environ.get("EXTRACTOR_LARGE_FILE_BYTES", 20 * 1024 * 1024))
+
+def get_file_ext(filename):
+    """Lower-cased extension, treating '.tar.gz' as a single extension"""
+    lowered = filename.lower()
+    if lowered.endswith('.tar.gz'):
+        return '.tar.gz'
+    return os.path.splitext(lowered)[1]
+
 def validate_file(filename):
     """Validate file existence and extension"""
-    if not os.path.exists(filename):
-        return False, "File does not exist."
-    file_ext = os.path.splitext(filename)[1].lower()
-    if file_ext not in ALLOWED_EXTENSIONS:
-        return False, f"Unsupported file type '{file_ext}'. Supported types: {', '.join(ALLOWED_EXTENSIONS)}"
-    return True, ""
+    with trace_span("validate_file"):
+        if not os.path.exists(filename):
+            return False, "File does not exist."
+        file_ext = get_file_ext(filename)
+        if file_ext not in ALLOWED_EXTENSIONS and file_ext not in ARCHIVE_EXTENSIONS:
+            supported = sorted(ALLOWED_EXTENSIONS | ARCHIVE_EXTENSIONS)
+            return False, f"Unsupported file type '{file_ext}'. Supported types: {', '.join(supported)}"
+        return True, ""
+
+# Extractors take a "source": a filesystem path or a seekable binary file object
+def read_source_bytes(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    source.seek(0)
+    return source.read()
+
+def rewind_source(source):
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    return source
+
+# Container formats are handed to their readers as a read-only mmap of the file: reads
+# and seeks are served from the OS page cache instead of a private copy of the file
+# (PyPDF2, for one, reads a whole file into a BytesIO when given a path). A mapped file that
+# is truncated while it is read kills the process with SIGBUS, so inputs someone may still
+# be rewriting (watch mode) are read normally; queue inputs are write-once copies and uploads
+# are private temp files, so both keep the mmap.
+MMAP_INPUTS = os.environ.get("EXTRACTOR_MMAP_INPUTS", "1") != "0"
+MMAP_INPUT_EXTENSIONS = {'.pdf', '.doc', '.docx', '.xlsx', '.ppt', '.pptx', '.epub'}
+
+class MappedInput(io.RawIOBase):
+    """Seekable, read-only file object over an mmap of a file"""
+
+    def __init__(self, path):
+        self.name = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._map)
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = offset
+        return self._pos
+
+    def read(self, size=-1):
+        end = len(self._map) if size is None or size < 0 else min(self._pos + size, len(self._map))
+        data = self._map[self._pos:end] if end > self._pos else b""
+        self._pos = max(self._pos, end)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readline(self, size=-1):
+        end = self._map.find(b"\n", self._pos)
+        end = len(self._map) if end < 0 else end + 1
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+        return self.read(end - self._pos)
+
+    def close(self):
+        if not self.closed:
+            self._map.close()
+        super().close()
+
+def source_path(source):
+    """Filesystem path behind a source, if it has one"""
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    if isinstance(source, MappedInput):
+        return source.name
+    return None
+
+@contextmanager
+def mapped_input(source, file_ext=None):
+    """Yield a MappedInput for a container-format path; other sources pass through unchanged"""
+    if (not MMAP_INPUTS or not isinstance(source, (str, os.PathLike))
+            or (file_ext or get_file_ext(source)) not in MMAP_INPUT_EXTENSIONS or not os.path.getsize(source)):
+        yield source
+        return
+    mapped = MappedInput(source)
+    try:
+        yield mapped
+    finally:
+        mapped.close()
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None where getrusage is unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB on Linux and the BSDs
+    return peak if sys.platform == "darwin" else peak * 1024
+
+@contextmanager
+def source_as_path(source, suffix):
+    """Yield a filesystem path for libraries that cannot read file objects"""
+    if source_path(source) is not None:
+        yield source_path(source)
+        return
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(read_source_bytes(source))
+        yield tmp_path
+    finally:
+        os.unlink(tmp_path)
 
 # File type specific extraction functions
+@traced
 def extract_text_from_txt(filename):
+    data = read_source_bytes(filename)
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            return f.read()
+        return data.decode('utf-8')
     except UnicodeDecodeError:
         # Try different encodings if utf-8 fails
         for encoding in ['latin-1', 'cp1252', 'iso-8859-1']:
             try:
-                with open(filename, 'r', encoding=encoding) as f:
-                    return f.read()
+                return data.decode(encoding)
             except UnicodeDecodeError:
                 continue
         raise Exception("Failed to decode text file with multiple encodings")
 
+@traced
 def extract_text_from_md(filename):
-    with open(filename, 'r', encoding='utf-8') as f:
-        return markdown(f.read(), extras=['fenced-code-blocks', 'tables', 'header-ids'])
+    content = read_source_bytes(filename).decode('utf-8')
+    return markdown(content, extras=['fenced-code-blocks', 'tables', 'header-ids'])
 
+@traced
 def extract_text_from_json(filename):
-    with open(filename, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        return json.dumps(data, indent=2, ensure_ascii=False)
+    data = json.loads(read_source_bytes(filename))
+    return json.dumps(data, indent=2, ensure_ascii=False)
 
-def extract_text_from_csv(filename):
+@traced
+def extract_text_from_csv(filename, max_rows=None):
     try:
-        df = pd.read_csv(filename)
+        df = pd.read_csv(rewind_source(filename), nrows=max_rows)
         return df.to_string(index=False)
     except pd.errors.EmptyDataError:
         return "CSV file is empty"
     except Exception as e:
         # Try with different encodings and delimiters
         try:
-            df = pd.read_csv(filename, encoding='latin-1')
+            df = pd.read_csv(rewind_source(filename), encoding='latin-1', nrows=max_rows)
             return df.to_string(index=False)
         except:
             try:
-                df = pd.read_csv(filename, sep=';')
+                df = pd.read_csv(rewind_source(filename), sep=';', nrows=max_rows)
                 return df.to_string(index=False)
             except:
                 raise Exception(f"Failed to parse CSV: {str(e)}")
 
-def extract_text_from_pdf(filename):
+# Optional normalization of extracted text, applied to each segment as it streams
+NORMALIZE_TEXT = os.environ.get("EXTRACTOR_NORMALIZE", "0") != "0"
+# Characters str.splitlines() breaks on
+LINE_BREAK_CHARS = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+# C0/C1 controls other than tab and line breaks, plus invisible format characters
+# (BOM, zero-width space, soft hyphen) that PDF and Word text tends to carry
+DELETED_CHARS = (
+    [c for c in range(0x20) if c != 0x09 and chr(c) not in LINE_BREAK_CHARS] + [0x7f]
+    + [c for c in range(0x80, 0xa0) if c != 0x85] + [0x00ad, 0x200b, 0xfeff]
+)
+
+class TextNormalizer:
+    """Configurable text cleanup for extracted text
+
+    Unicode normalization and control-character deletion each run as one C-level pass
+    (skipped when there is nothing to do); de-hyphenation and whitespace handling are
+    alternatives of a single precompiled regex. Measured with --benchmark-normalize, this is
+    about as fast as running the steps one after another: the regex scan dominates either way.
+
+    whitespace: "keep"; "lines" strips every line and drops blank ones; "paragraphs" also
+    collapses runs of spaces and tabs and keeps one blank line between paragraphs.
+    """
+
+    def __init__(self, form="NFC", strip_controls=True, dehyphenate=True, whitespace="paragraphs"):
+        self.form = form
+        self.table = dict.fromkeys(DELETED_CHARS) if strip_controls else None
+        self.deleted = re.compile("[" + re.escape("".join(map(chr, DELETED_CHARS))) + "]") if strip_controls else None
+        self.whitespace = whitespace
+        breaks = re.escape(LINE_BREAK_CHARS)
+        other_breaks = re.escape(LINE_BREAK_CHARS.replace("\n", ""))
+        space = rf"[^\S{breaks}]"  # horizontal whitespace
+        # Every alternative starts by consuming a character and only then looks around, so
+        # most positions are rejected after one class test. Whitespace runs around line breaks
+        # are matched from the start of the run (keeps the scan linear) and only when they
+        # need rewriting, so already-clean text triggers no callbacks.
+        def line_run(clean_newline):
+            return (rf"{space}(?<!{space}{space}){space}*[{breaks}]\s*"
+                    rf"|[{other_breaks}]\s*|\n(?!{clean_newline})\s*")
+        alternatives = []
+        if dehyphenate:
+            # "exam-\nple" -> "example"; a capital after the break is kept as a real hyphen
+            alternatives.append((rf"-(?<=\w-){space}*(?:\r\n|[{breaks}])\s*(?=[^\W\d_A-Z])", ""))
+        if whitespace == "lines":
+            alternatives.append((line_run(r"(?!\s)"), "\n"))
+        elif whitespace == "paragraphs":
+            # One break is \r\n taken whole (a lone \r only when no \n follows), so CRLF text
+            # is not read as a blank line after every line
+            line_break = rf"(?:\r\n|\r(?!\n)|[{re.escape(LINE_BREAK_CHARS.replace(chr(13), ''))}])"
+            paragraph_break = re.compile(rf"{line_break}{space}*{line_break}")
+            alternatives.append((line_run(r"\n?(?!\s)"),
+                                 lambda m: "\n\n" if paragraph_break.search(m.group()) else "\n"))
+            alternatives.append((rf"{space}{{2,}}|[^\S{breaks} ]", " "))
+        self.regex = re.compile("|".join(f"({pattern})" for pattern, _ in alternatives)) if alternatives else None
+        self.replacements = [None] + [replacement for _, replacement in alternatives]
+
+    def _replace(self, match):
+        replacement = self.replacements[match.lastindex]
+        return replacement if isinstance(replacement, str) else replacement(match)
+
+    def __call__(self, text):
+        if self.form and not unicodedata.is_normalized(self.form, text):
+            text = unicodedata.normalize(self.form, text)
+        if self.table and self.deleted.search(text):
+            text = text.translate(self.table)
+        if self.regex:
+            text = self.regex.sub(self._replace, text)
+        return text if self.whitespace == "keep" else text.strip()
+
+text_normalizer = TextNormalizer()
+# Reproduces the original EPUB cleanup: strip each line, drop blank lines
+epub_line_normalizer = TextNormalizer(form=None, strip_controls=False, dehyphenate=False, whitespace="lines")
+
+def normalize_segments(segments):
+    for kind, index, segment_text in segments:
+        yield kind, index, text_normalizer(segment_text) if NORMALIZE_TEXT else segment_text
+
+def benchmark_normalization(text, repeat=5):
+    """MB/s of text_normalizer vs the same steps run as one TextNormalizer pass each
+
+    Both produce identical output (checked), so only the cost of combining the steps differs.
+    """
+    steps = [
+        TextNormalizer(strip_controls=False, dehyphenate=False, whitespace="keep"),
+        TextNormalizer(form=None, dehyphenate=False, whitespace="keep"),
+        TextNormalizer(form=None, strip_controls=False, whitespace="keep"),
+        TextNormalizer(form=None, strip_controls=False, dehyphenate=False),
+    ]
+
+    def separate_passes(value):
+        for step in steps:
+            value = step(value)
+        return value
+
+    if separate_passes(text) != text_normalizer(text):
+        raise ValueError("separate passes disagree with text_normalizer on this sample")
+    size_mb = len(text.encode('utf-8')) / 1e6
+    results = {}
+    for label, normalize in (("fused", text_normalizer), ("separate passes", separate_passes)):
+        best = min(_time_call(normalize, text) for _ in range(repeat))
+        results[label] = size_mb / best
+    return results
+
+def _time_call(function, *args):
+    start_time = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start_time
+
+# Structured formats are read as a stream of (kind, index, text) segments, one per
+# page/sheet/slide/table/chapter, so callers can observe them as they are produced
+def emit_segments(segments, on_segment=None):
+    for segment in normalize_segments(trace_segments(segments)):
+        if on_segment:
+            on_segment(*segment)
+        yield segment
+
+# Page text is cached by a hash of what extract_text() reads: the page's content streams
+# and its resources (fonts, ToUnicode maps, form XObjects), so a regenerated PDF only
+# re-extracts the pages that actually changed. Set EXTRACTOR_PAGE_CACHE_DB="" to disable.
+PAGE_CACHE_DB_PATH = os.environ.get("EXTRACTOR_PAGE_CACHE_DB", "pdf_page_cache.sqlite3")
+# Part of every page hash, so text cached by another PyPDF2 version is never reused
+PAGE_CACHE_SALT = f"PyPDF2 {PyPDF2.__version__}".encode('utf-8')
+# Page keys that affect extracted text; /Parent, /Annots etc. are left out
+PAGE_HASH_KEYS = ('/Contents', '/Resources', '/Rotate')
+
+_page_cache_conn = None
+_page_cache_pid = None
+
+def get_page_cache_connection():
+    """Per-process connection: PDF pages are extracted inside pool workers"""
+    global _page_cache_conn, _page_cache_pid
+    if _page_cache_pid != os.getpid():
+        conn = sqlite3.connect(PAGE_CACHE_DB_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS pdf_pages (page_hash TEXT PRIMARY KEY, text TEXT NOT NULL)")
+        _page_cache_conn, _page_cache_pid = conn, os.getpid()
+    return _page_cache_conn
+
+def _pdf_object_digest(obj, memo, active):
+    """(digest, complete) of an object's dereferenced content
+
+    Indirect references are followed but never hashed themselves, so the same page hashes
+    the same in a rewritten file with renumbered objects. `memo` holds digests per object
+    across the document; a reference back into an object still being hashed is cut without
+    adding anything, and digests that depend on such a cut are not memoized (`complete`).
+    """
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref in memo:
+            return memo[ref], True
+        if ref in active:
+            return b"", False
+        active.add(ref)
+        try:
+            result = _pdf_object_digest(obj.get_object(), memo, active)
+        finally:
+            active.discard(ref)
+        if result[1]:
+            memo[ref] = result[0]
+        return result
+    complete = True
+    digest = hashlib.sha256()
+    if isinstance(obj, StreamObject):
+        # Raw (still encoded) bytes: identical streams hash identically without inflating them
+        digest.update(b"S%d:" % len(obj._data))
+        digest.update(obj._data)
+    if isinstance(obj, dict):
+        digest.update(b"{")
+        for key in sorted(obj):
+            digest.update(key.encode('utf-8', errors='replace'))
+            value, value_complete = _pdf_object_digest(obj.raw_get(key), memo, active)
+            digest.update(value)
+            complete = complete and value_complete
+        digest.update(b"}")
+    elif isinstance(obj, list):
+        digest.update(b"[")
+        for item in obj:
+            value, value_complete = _pdf_object_digest(item, memo, active)
+            digest.update(value)
+            complete = complete and value_complete
+        digest.update(b"]")
+    elif not isinstance(obj, StreamObject):  # streams are dicts too and were handled above
+        digest.update(repr(obj).encode('utf-8', errors='replace'))
+    return digest.digest(), complete
+
+def pdf_page_hash(page, memo=None):
+    """Content hash of a page's text-relevant entries; pass one `memo` dict per document"""
+    memo = memo if memo is not None else {}
+    digest = hashlib.sha256(PAGE_CACHE_SALT)
+    for key in PAGE_HASH_KEYS:
+        digest.update(key.encode('ascii'))
+        if key in page:
+            digest.update(_pdf_object_digest(page.raw_get(key), memo, set())[0])
+    return digest.hexdigest()
+
+# Scanned pages have images but no text-showing operators; they are found from the content
+# stream and resources alone and sent to OCR instead of extract_text()
+OCR_SUPPORT = bool(shutil.which("pdftoppm") and shutil.which("tesseract"))
+OCR_DPI = int(os.environ.get("EXTRACTOR_OCR_DPI", 300))
+OCR_LANG = os.environ.get("EXTRACTOR_OCR_LANG", "eng")
+# Concurrent tesseract processes across the whole pool: each of the MAX_WORKERS extraction
+# processes gets its own OCR threads, so the budget is split between them
+OCR_WORKERS = int(os.environ.get("EXTRACTOR_OCR_WORKERS", os.cpu_count() or 2))
+OCR_THREADS = max(1, OCR_WORKERS // MAX_WORKERS)
+# Pages planned ahead of the one being yielded, so OCR runs in parallel with the rest
+OCR_LOOKAHEAD = OCR_THREADS * 2
+PDF_STATS_KEYS = ("hits", "misses", "ocr", "image_only", "fallbacks")
+# Text objects (BT ... ET) only count if they show a string; generators often emit empty ones
+_TEXT_OBJECT = re.compile(rb"(?<![A-Za-z0-9_])BT(?![A-Za-z0-9_])(.*?)(?<![A-Za-z0-9_])ET(?![A-Za-z0-9_])", re.S)
+_SHOW_TEXT = re.compile(rb"[)>\]]\s*(?:Tj|TJ|'|\")")
+_INLINE_IMAGE = re.compile(rb"(?<![A-Za-z0-9_])BI(?![A-Za-z0-9_])")
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+def get_ocr_pool():
+    """Threads that drive pdftoppm/tesseract subprocesses, one page each"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ThreadPoolExecutor(max_workers=OCR_THREADS, thread_name_prefix="ocr")
+        return _ocr_pool
+
+def _shows_text(data):
+    return any(_SHOW_TEXT.search(block) for block in _TEXT_OBJECT.findall(data))
+
+def _scan_xobjects(resources, depth=0):
+    """(has_text, has_image) over a resource dict's XObjects, descending into form XObjects"""
+    has_text = has_image = False
+    xobjects = resources.get('/XObject') if resources else None
+    xobjects = xobjects.get_object() if xobjects is not None else {}
+    for ref in xobjects.values():
+        xobject = ref.get_object()
+        subtype = xobject.get('/Subtype')
+        if subtype == '/Image':
+            has_image = True
+        elif subtype == '/Form' and depth < 5:
+            if _shows_text(xobject.get_data()):
+                return True, has_image
+            form_resources = xobject.get('/Resources')
+            form_text, form_image = _scan_xobjects(form_resources.get_object() if form_resources else None, depth + 1)
+            if form_text:
+                return True, has_image
+            has_image = has_image or form_image
+    return has_text, has_image
+
+def is_image_only_page(page):
+    """True for pages that draw an image but never show text, decided without extracting text"""
+    contents = page.get_contents()
+    data = contents.get_data() if contents is not None else b""
+    if _shows_text(data):
+        return False
+    resources = page.get('/Resources')
+    has_text, has_image = _scan_xobjects(resources.get_object() if resources else None)
+    return not has_text and (has_image or bool(_INLINE_IMAGE.search(data)))
+
+def ocr_pdf_page(pdf_path, page_number, dpi=None, lang=None):
+    """Rasterize one page with pdftoppm and read it with tesseract"""
+    # Read at call time: --ocr-dpi and worker settings replace the globals after import
+    dpi = dpi or OCR_DPI
+    lang = lang or OCR_LANG
+    with tempfile.TemporaryDirectory(prefix="ocr-") as tmp_dir:
+        image_prefix = os.path.join(tmp_dir, "page")
+        subprocess.run(["pdftoppm", "-r", str(dpi), "-f", str(page_number), "-l", str(page_number),
+                        "-gray", "-png", "-singlefile", pdf_path, image_prefix],
+                       check=True, capture_output=True)
+        # Parallelism comes from the pool; keep each tesseract single-threaded
+        result = subprocess.run(["tesseract", image_prefix + ".png", "stdout", "-l", lang],
+                                check=True, capture_output=True, env={**os.environ, "OMP_THREAD_LIMIT": "1"})
+    return result.stdout.decode('utf-8', errors='replace').strip()
+
+# Page text comes from a pluggable backend; PyPDF2 still parses the document structure
+# (page hashes, image detection, form fields). Unless EXTRACTOR_PDF_BACKEND forces one, the
+# calibrated policy picks a backend per document class (the producing application).
+PDF_BACKEND = os.environ.get("EXTRACTOR_PDF_BACKEND") or None
+PDF_BACKEND_POLICY_PATH = os.environ.get("EXTRACTOR_PDF_BACKEND_POLICY", "pdf_backend_policy.json")
+PDF_CALIBRATION_PAGES = int(os.environ.get("EXTRACTOR_PDF_CALIBRATION_PAGES", 20))
+# A backend's text is acceptable if it has at least this share of the best backend's characters
+PDF_MIN_TEXT_RATIO = 0.9
+
+class PyPDF2Backend:
+    name = "pypdf2"
+
+    def __init__(self, source, reader):
+        # Reuses the reader that already parsed the document structure, when there is one
+        self.reader = reader if reader is not None else PdfReader(source)
+
+    def page_text(self, index):
+        return self.reader.pages[index].extract_text() or ""
+
+    def close(self):
+        pass
+
+class PdfminerBackend:
+    name = "pdfminer"
+
+    def __init__(self, source, reader):
+        # pdfminer buffers reads and assumes it owns the file position, so it gets its own stream
+        path = source_path(source)
+        self.stream = open(path, 'rb') if path is not None else io.BytesIO(read_source_bytes(source))
+        self.pages = list(PDFPage.create_pages(PDFDocument(PDFParser(self.stream))))
+        self.resources = PDFResourceManager()
+
+    def page_text(self, index):
+        output = io.StringIO()
+        device = TextConverter(self.resources, output, laparams=LAParams())
+        try:
+            PDFPageInterpreter(self.resources, device).process_page(self.pages[index])
+        finally:
+            device.close()
+        return output.getvalue().rstrip("\x0c").strip()
+
+    def close(self):
+        self.stream.close()
+
+# PDFium is not thread-safe: every call into it, on any document, holds this lock
+_pdfium_lock = threading.RLock()
+
+class PdfiumBackend:
+    name = "pdfium"
+
+    def __init__(self, source, reader):
+        path = source_path(source)
+        data = path if path is not None else read_source_bytes(source)
+        with _pdfium_lock:
+            self.document = pdfium.PdfDocument(data)
+
+    def page_text(self, index):
+        with _pdfium_lock:
+            page = self.document[index]
+            try:
+                textpage = page.get_textpage()
+                text = textpage.get_text_range()
+                textpage.close()
+            finally:
+                page.close()
+        return text.replace("\r\n", "\n").strip()
+
+    def close(self):
+        with _pdfium_lock:
+            self.document.close()
+
+PDF_BACKENDS = {"pypdf2": PyPDF2Backend}
+if PDFMINER_SUPPORT:
+    PDF_BACKENDS["pdfminer"] = PdfminerBackend
+if PDFIUM_SUPPORT:
+    PDF_BACKENDS["pdfium"] = PdfiumBackend
+
+_pdf_backend_policy = None
+
+def get_pdf_backend_policy():
+    global _pdf_backend_policy
+    if _pdf_backend_policy is None:
+        _pdf_backend_policy = {}
+        if os.path.exists(PDF_BACKEND_POLICY_PATH):
+            try:
+                with open(PDF_BACKEND_POLICY_PATH, 'r', encoding='utf-8') as f:
+                    _pdf_backend_policy = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable PDF backend policy {PDF_BACKEND_POLICY_PATH}: {str(e)}")
+    return _pdf_backend_policy
+
+def pdf_document_class(reader):
+    """Coarse document class: the first word of the producing application, e.g. microsoft or latex"""
+    try:
+        info = reader.metadata or {}
+        producer = str(info.get('/Producer') or info.get('/Creator') or "")
+    except Exception:
+        producer = ""
+    match = re.search(r"[A-Za-z]+", producer)
+    return match.group(0).lower() if match else "unknown"
+
+def pdf_backend_order(doc_class):
+    """Backends to try for a document class, preferred first"""
+    preferred = PDF_BACKEND or get_pdf_backend_policy().get(doc_class, {}).get("backend") or "pypdf2"
+    return sorted(PDF_BACKENDS, key=lambda name: name != preferred)
+
+def pdf_text_key(page_hash, backend_name):
+    # PyPDF2 text keeps the plain page hash; other backends' text is cached separately
+    if page_hash is None or backend_name == "pypdf2":
+        return page_hash
+    return f"{page_hash}:{backend_name}"
+
+class PdfBackendChain:
+    """Opens backends lazily in preference order and moves to the next one when a backend fails"""
+
+    def __init__(self, source, reader, names):
+        self.source = source
+        self.reader = reader
+        self.names = names
+        self.position = 0
+        self.backend = None
+        self.fallbacks = 0
+
+    @property
+    def name(self):
+        return self.names[self.position]
+
+    def page_text(self, index):
+        while True:
+            try:
+                if self.backend is None:
+                    self.backend = PDF_BACKENDS[self.name](self.source, self.reader)
+                return self.backend.page_text(index)
+            except Exception as e:
+                if self.position + 1 >= len(self.names):
+                    raise
+                logger.warning(f"PDF backend {self.name} failed on page {index + 1} ({str(e)}); "
+                               f"falling back to {self.names[self.position + 1]}")
+                self.close()
+                self.position += 1
+                self.fallbacks += 1
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
+            self.backend = None
+
+def calibrate_pdf_backends(paths, sample_pages=PDF_CALIBRATION_PAGES):
+    """Time every backend on sample PDFs and store the fastest acceptable one per document class"""
+    results = {}
+    for path in paths:
+        with mapped_input(path, '.pdf') as source:
+            reader = PdfReader(source)
+            doc_class = pdf_document_class(reader)
+            page_count = min(sample_pages, len(reader.pages))
+            for name, backend_class in PDF_BACKENDS.items():
+                entry = results.setdefault(doc_class, {}).setdefault(
+                    name, {"seconds": 0.0, "pages": 0, "chars": 0, "errors": 0})
+                start_time = time.perf_counter()
+                try:
+                    # No shared reader: each backend is timed from opening the file to its last page
+                    backend = backend_class(path, None)
+                    try:
+                        chars = sum(len(backend.page_text(i)) for i in range(page_count))
+                    finally:
+                        backend.close()
+                except Exception as e:
+                    logger.warning(f"PDF backend {name} failed on {path}: {str(e)}")
+                    entry["errors"] += 1
+                    continue
+                entry["seconds"] += time.perf_counter() - start_time
+                entry["pages"] += page_count
+                entry["chars"] += chars
+
+    policy = get_pdf_backend_policy()
+    for doc_class, by_backend in results.items():
+        best_chars = max(entry["chars"] for entry in by_backend.values())
+        for entry in by_backend.values():
+            entry["pages_per_second"] = entry["pages"] / entry["seconds"] if entry["seconds"] else 0.0
+            entry["acceptable"] = not entry["errors"] and entry["chars"] >= PDF_MIN_TEXT_RATIO * best_chars
+        acceptable = [name for name, entry in by_backend.items() if entry["acceptable"]] or ["pypdf2"]
+        policy[doc_class] = {
+            "backend": max(acceptable, key=lambda name: by_backend[name]["pages_per_second"]),
+            "backends": by_backend,
+        }
+    write_text_atomic(PDF_BACKEND_POLICY_PATH, json.dumps(policy, indent=2, sort_keys=True))
+    return policy
+
+def page_cache_note(stats):
+    """Per-document page cache hit rate and OCR summary for a stats dict filled by iter_pdf_segments"""
+    notes = []
+    total = stats.get("hits", 0) + stats.get("misses", 0)
+    # A cold or disabled cache has nothing to report
+    if stats.get("hits"):
+        notes.append(f"Page cache: {stats['hits']}/{total} pages reused ({stats['hits'] / total:.0%})")
+    if stats.get("ocr"):
+        notes.append(f"OCR: {stats['ocr']} scanned pages at {OCR_DPI} DPI")
+    if stats.get("backend", "pypdf2") != "pypdf2" or stats.get("fallbacks"):
+        fallbacks = f" after {stats['fallbacks']} fallback(s)" if stats.get("fallbacks") else ""
+        notes.append(f"PDF backend: {stats['backend']}{fallbacks}")
+    if stats.get("image_only"):
+        hint = "" if OCR_SUPPORT else " (install pdftoppm and tesseract for OCR)"
+        notes.append(f"{stats['image_only']} image-only pages without text{hint}")
+    return "; ".join(notes)
+
+def iter_pdf_segments(filename, pages=None, stats=None):
+    """Page segments, optionally limited to the 0-based `pages` range; form data follows the last page
+
+    Unchanged pages are served from the page cache, image-only pages go to OCR when it is
+    available and the rest to the document class's PDF backend; `stats` (if given) counts
+    cache hits and misses, OCR'd and skipped pages, and backend fallbacks.
+    """
     reader = PdfReader(filename)
-    text = []
+    pages = pages or range(len(reader.pages))
+    stats = stats if stats is not None else {}
+    for key in PDF_STATS_KEYS:
+        stats.setdefault(key, 0)
+    backends = PdfBackendChain(filename, reader, pdf_backend_order(pdf_document_class(reader)))
+    stats["backend"] = backends.name
+    conn = get_page_cache_connection() if PAGE_CACHE_DB_PATH else None
+    misses = []
+    planned = {}
+    # Fonts and other resources are shared between pages; each is hashed once per document
+    digests = {}
+    temp_paths = ExitStack()
+    pdf_path = None
+
+    def cached_text(key):
+        row = conn.execute("SELECT text FROM pdf_pages WHERE page_hash = ?", (key,)).fetchone() if conn else None
+        return row[0] if row else None
+
+    def plan(i):
+        # -> ("hit", text), ("skip", ""), ("extract", key) or ("ocr", key, future)
+        nonlocal pdf_path
+        page = reader.pages[i]
+        page_hash = pdf_page_hash(page, digests) if conn else None
+        text = cached_text(pdf_text_key(page_hash, backends.name))
+        if text is not None:
+            return "hit", text
+        if not is_image_only_page(page):
+            return "extract", page_hash
+        if not OCR_SUPPORT:
+            return "skip", ""
+        # OCR text is keyed by its settings as well, so a DPI or language change re-reads the page
+        ocr_key = f"{page_hash}:ocr:{OCR_LANG}:{OCR_DPI}" if page_hash else None
+        text = cached_text(ocr_key)
+        if text is not None:
+            return "hit", text
+        if pdf_path is None:
+            pdf_path = temp_paths.enter_context(source_as_path(filename, '.pdf'))
+        return "ocr", ocr_key, get_ocr_pool().submit(ocr_pdf_page, pdf_path, i + 1, OCR_DPI, OCR_LANG)
     
     # Extract text from pages
-    for i, page in enumerate(reader.pages):
-        page_text = page.extract_text()
-        if page_text:
-            text.append(f"--- Page {i+1} ---\n{page_text}")
-        else:
-            text.append(f"--- Page {i+1} [No extractable text] ---")
+    try:
+        order = list(pages)
+        for position, i in enumerate(order):
+            for ahead in order[position:position + OCR_LOOKAHEAD]:
+                if ahead not in planned:
+                    planned[ahead] = plan(ahead)
+            action = planned.pop(i)
+            if action[0] == "hit":
+                stats["hits"] += 1
+                page_text = action[1]
+            elif action[0] == "skip":
+                stats["misses"] += 1
+                stats["image_only"] += 1
+                page_text = ""
+            elif action[0] == "ocr":
+                stats["misses"] += 1
+                try:
+                    page_text = action[2].result()
+                    stats["ocr"] += 1
+                    misses.append((action[1], page_text))
+                except (subprocess.CalledProcessError, OSError) as e:
+                    logger.error(f"OCR failed for page {i + 1}: {str(e)}")
+                    stats["image_only"] += 1
+                    page_text = ""
+            else:
+                stats["misses"] += 1
+                page_text = backends.page_text(i)
+                misses.append((pdf_text_key(action[1], backends.name), page_text))
+            yield "page", i + 1, page_text
+    finally:
+        for action in planned.values():
+            if action[0] == "ocr":
+                action[2].cancel()
+        temp_paths.close()
+        backends.close()
+        stats["backend"] = backends.name
+        stats["fallbacks"] += backends.fallbacks
+        # Also runs when a budgeted reader stops early, so preview pages are cached too
+        if conn and misses:
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO pdf_pages (page_hash, text) VALUES (?, ?)", misses)
+    if pages.stop < len(reader.pages):
+        return
     
     # Try to extract form fields if present
     try:
         fields = reader.get_fields()
-        if fields:
-            form_data = []
-            for field, value in fields.items():
-                if value:
-                    form_data.append(f"{field}: {value}")
-            if form_data:
-                text.append("\n--- Form Data ---\n" + "\n".join(form_data))
     except:
-        pass
+        fields = None
+    if fields:
+        form_data = []
+        for field, value in fields.items():
+            if value:
+                form_data.append(f"{field}: {value}")
+        if form_data:
+            yield "form", 1, "\n".join(form_data)
+
+def render_pdf_segments(segments):
+    text = []
+    for kind, index, segment_text in segments:
+        if kind == "form":
+            text.append("\n--- Form Data ---\n" + segment_text)
+        elif segment_text:
+            text.append(f"--- Page {index} ---\n{segment_text}")
+        else:
+            text.append(f"--- Page {index} [No extractable text] ---")
     
     return "\n\n".join(text)
 
-def extract_text_from_docx(filename):
+@traced
+def extract_text_from_pdf(filename, on_segment=None, stats=None):
+    return render_pdf_segments(emit_segments(iter_pdf_segments(filename, stats=stats), on_segment))
+
+def iter_docx_segments(filename):
     doc = Document(filename)
-    text = []
     
     # Extract document properties if available
     try:
@@ -122,10 +1013,10 @@ def extract_text_from_docx(filename):
             props.append(f"Title: {core_props.title}")
         if hasattr(core_props, 'author') and core_props.author:
             props.append(f"Author: {core_props.author}")
-        if props:
-            text.append("--- Document Properties ---\n" + "\n".join(props))
     except:
-        pass
+        props = []
+    if props:
+        yield "properties", 1, "\n".join(props)
     
     # Extract paragraphs
     para_text = []
@@ -134,35 +1025,54 @@ def extract_text_from_docx(filename):
             para_text.append(para.text)
     
     if para_text:
-        text.append("--- Content ---\n" + "\n".join(para_text))
+        yield "content", 1, "\n".join(para_text)
     
     # Extract tables
-    tables_text = []
     for i, table in enumerate(doc.tables):
-        tables_text.append(f"--- Table {i+1} ---")
+        rows = []
         for row in table.rows:
             row_text = " | ".join(cell.text for cell in row.cells)
             if row_text.strip():
-                tables_text.append(row_text)
+                rows.append(row_text)
+        yield "table", i + 1, "\n".join(rows)
+
+def render_docx_segments(segments):
+    text = []
+    tables_text = []
+    for kind, index, segment_text in segments:
+        if kind == "properties":
+            text.append("--- Document Properties ---\n" + segment_text)
+        elif kind == "content":
+            text.append("--- Content ---\n" + segment_text)
+        else:
+            tables_text.append(f"--- Table {index} ---")
+            if segment_text:
+                tables_text.append(segment_text)
     
     if tables_text:
         text.append("\n".join(tables_text))
     
     return "\n\n".join(text)
 
-def extract_text_from_xlsx(filename):
+@traced
+def extract_text_from_docx(filename, on_segment=None):
+    return render_docx_segments(emit_segments(iter_docx_segments(filename), on_segment))
+
+def iter_xlsx_segments(filename, max_rows=None, stats=None):
+    """Sheet segments; with `max_rows`, a read-only pass over at most that many rows per sheet
+    that sets stats["truncated"] when a sheet has more"""
+    if max_rows is not None:
+        yield from _iter_xlsx_head_segments(filename, max_rows, stats if stats is not None else {})
+        return
     wb = load_workbook(filename, data_only=True)  # data_only=True to get values instead of formulas
-    text = []
     
     for sheet in wb:
-        sheet_name = sheet.title
-        text.append(f"\n--- Sheet: {sheet_name} ---\n")
-        
         # Find the maximum column with data
         max_col = sheet.max_column
         max_row = sheet.max_row
         
         # Extract data rows
+        rows = []
         for row in range(1, max_row + 1):
             row_values = []
             for col in range(1, max_col + 1):
@@ -170,35 +1080,69 @@ def extract_text_from_xlsx(filename):
                 row_values.append(str(cell_value) if cell_value is not None else "")
             
             if any(val.strip() for val in row_values):  # Only add if there's actual content
-                text.append(" | ".join(row_values))
-    
-    return "\n".join(text)
+                rows.append(" | ".join(row_values))
+        
+        yield "sheet", sheet.title, "\n".join(rows)
 
-def extract_text_from_xls(filename):
-    """Extract text from legacy Excel .xls files"""
-    workbook = xlrd.open_workbook(filename)
-    text = []
+def _iter_xlsx_head_segments(filename, max_rows, stats):
+    # Read-only mode streams rows from the worksheet XML instead of loading every cell
+    wb = load_workbook(filename, data_only=True, read_only=True)
+    try:
+        for sheet in wb:
+            rows = []
+            for row_number, row in enumerate(sheet.iter_rows(values_only=True), 1):
+                if row_number > max_rows:
+                    stats["truncated"] = True
+                    break
+                row_values = [str(value) if value is not None else "" for value in row]
+                if any(val.strip() for val in row_values):
+                    rows.append(" | ".join(row_values))
+            yield "sheet", sheet.title, "\n".join(rows)
+    finally:
+        wb.close()
+
+def iter_xls_segments(filename, max_rows=None, stats=None):
+    if isinstance(filename, (str, os.PathLike)):
+        workbook = xlrd.open_workbook(filename)
+    else:
+        workbook = xlrd.open_workbook(file_contents=read_source_bytes(filename))
     
     for sheet_idx in range(workbook.nsheets):
         sheet = workbook.sheet_by_index(sheet_idx)
-        sheet_name = sheet.name
-        text.append(f"\n--- Sheet: {sheet_name} ---\n")
-        
-        for row_idx in range(sheet.nrows):
+        rows = []
+        if max_rows is not None and sheet.nrows > max_rows and stats is not None:
+            stats["truncated"] = True
+        for row_idx in range(min(sheet.nrows, max_rows) if max_rows is not None else sheet.nrows):
             row_values = sheet.row_values(row_idx)
             row_text = " | ".join(str(cell) for cell in row_values if cell)
             if row_text.strip():
-                text.append(row_text)
+                rows.append(row_text)
+        
+        yield "sheet", sheet.name, "\n".join(rows)
+
+def render_sheets(segments):
+    text = []
+    for _, sheet_name, segment_text in segments:
+        text.append(f"\n--- Sheet: {sheet_name} ---\n")
+        if segment_text:
+            text.append(segment_text)
     
     return "\n".join(text)
 
-def extract_text_from_pptx(filename):
+@traced
+def extract_text_from_xlsx(filename, on_segment=None):
+    return render_sheets(emit_segments(iter_xlsx_segments(filename), on_segment))
+
+@traced
+def extract_text_from_xls(filename, on_segment=None):
+    """Extract text from legacy Excel .xls files"""
+    return render_sheets(emit_segments(iter_xls_segments(filename), on_segment))
+
+def iter_pptx_segments(filename):
     prs = Presentation(filename)
-    text = []
     
     for i, slide in enumerate(prs.slides):
         slide_text = []
-        slide_text.append(f"--- Slide {i+1} ---")
         
         # Extract from shapes
         for shape in slide.shapes:
@@ -209,27 +1153,36 @@ def extract_text_from_pptx(filename):
         if hasattr(slide, 'notes_slide') and slide.notes_slide and slide.notes_slide.notes_text_frame.text.strip():
             slide_text.append(f"[Notes: {slide.notes_slide.notes_text_frame.text.strip()}]")
         
-        text.append("\n".join(slide_text))
+        yield "slide", i + 1, "\n".join(slide_text)
+
+def render_pptx_segments(segments):
+    text = []
+    for _, index, segment_text in segments:
+        text.append(f"--- Slide {index} ---" + (f"\n{segment_text}" if segment_text else ""))
     
     return "\n\n".join(text)
 
-def extract_text_from_epub(filename):
-    """Extract text from EPUB e-books"""
+@traced
+def extract_text_from_pptx(filename, on_segment=None):
+    return render_pptx_segments(emit_segments(iter_pptx_segments(filename), on_segment))
+
+def iter_epub_segments(filename):
     book = epub.read_epub(filename)
-    text = []
     
     # Get metadata
     title = book.get_metadata('DC', 'title')
     creator = book.get_metadata('DC', 'creator')
     
+    metadata = []
     if title:
-        text.append(f"Title: {title[0][0]}")
+        metadata.append(f"Title: {title[0][0]}")
     if creator:
-        text.append(f"Author: {creator[0][0]}")
-    
-    text.append("--- Content ---")
+        metadata.append(f"Author: {creator[0][0]}")
+    if metadata:
+        yield "metadata", 1, "\n".join(metadata)
     
     # Extract content from HTML
+    chapter = 0
     for item in book.get_items():
         if item.get_type() == ebooklib.ITEM_DOCUMENT:
             # Extract text from HTML content
@@ -239,123 +1192,2372 @@ def extract_text_from_epub(filename):
             for script in soup(["script", "style"]):
                 script.extract()
             
-            content = soup.get_text(separator='\n')
-            # Clean up whitespace
-            content = '\n'.join(line.strip() for line in content.splitlines() if line.strip())
+            content = epub_line_normalizer(soup.get_text(separator='\n'))
             if content:
-                text.append(content)
+                chapter += 1
+                yield "chapter", chapter, content
+
+def render_epub_segments(segments):
+    text = []
+    content_started = False
+    for kind, _, segment_text in segments:
+        if kind == "chapter" and not content_started:
+            text.append("--- Content ---")
+            content_started = True
+        text.append(segment_text)
+    
+    if not content_started:
+        text.append("--- Content ---")
     
     return "\n\n".join(text)
 
-def extract_text_with_langchain(filename):
+@traced
+def extract_text_from_epub(filename, on_segment=None):
+    """Extract text from EPUB e-books"""
+    return render_epub_segments(emit_segments(iter_epub_segments(filename), on_segment))
+
+def choose_partition_strategy(filename):
+    """Pick unstructured's partitioning strategy, using "fast" for large files"""
+    if LANGCHAIN_STRATEGY:
+        return LANGCHAIN_STRATEGY
+    if os.path.getsize(filename) >= LARGE_FILE_BYTES:
+        return "fast"
+    return "auto"
+
+def iter_text_with_langchain(filename, strategy=None):
+    """Yield text one element at a time via UnstructuredFileLoader.lazy_load()"""
+    loader = UnstructuredFileLoader(
+        filename,
+        mode="elements",
+        strategy=strategy or choose_partition_strategy(filename)
+    )
+    for doc in loader.lazy_load():
+        if doc.page_content:
+            yield doc.page_content
+
+def benchmark_langchain_loading(filename, strategy=None, rounds=4):
+    """Compare latency and peak Python heap of load() against the lazy_load() fallback
+
+    Both write their text to a temporary file, as store_output() would. The two alternate
+    which goes first over `rounds` rounds so neither always pays for cold imports and
+    caches; seconds are the median and peak_bytes the maximum per method.
+    """
+    strategy = strategy or choose_partition_strategy(filename)
+    samples = {"load": [], "lazy_load": []}
+
+    def run(label, fn):
+        tracemalloc.start()
+        start = time.perf_counter()
+        chars = fn()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        samples[label].append((elapsed, peak, chars))
+
+    def write(text):
+        with tempfile.TemporaryFile('w', encoding='utf-8') as f:
+            return f.write(text)
+
+    def eager():
+        documents = UnstructuredFileLoader(filename, mode="elements", strategy=strategy).load()
+        return write("\n\n".join(doc.page_content for doc in documents if doc.page_content))
+
+    def lazy():
+        return write(extract_text_with_langchain(filename, strategy))
+
+    methods = [("load", eager), ("lazy_load", lazy)]
+    for round_index in range(rounds):
+        for label, fn in (methods if round_index % 2 == 0 else methods[::-1]):
+            run(label, fn)
+    return {label: {"seconds": sorted(elapsed for elapsed, _, _ in runs)[(len(runs) - 1) // 2],
+                    "peak_bytes": max(peak for _, peak, _ in runs),
+                    "chars": runs[-1][2]}
+            for label, runs in samples.items()}
+
+@traced
+def extract_text_with_langchain(filename, strategy=None, on_segment=None):
     """Use LangChain's UnstructuredFileLoader as a fallback"""
     try:
-        documents = UnstructuredFileLoader(filename).load()
-        return "\n".join(doc.page_content for doc in documents)
+        elements = (("element", i + 1, element_text)
+                    for i, element_text in enumerate(iter_text_with_langchain(filename, strategy)))
+        # Blank lines between elements, as single mode's load() produced before lazy_load()
+        return "\n\n".join(segment_text for _, _, segment_text in emit_segments(elements, on_segment))
     except Exception as e:
         logger.error(f"LangChain extraction failed: {str(e)}")
         raise Exception(f"LangChain extraction failed: {str(e)}")
 
-def extract_text(filename):
-    """Main extraction router with improved error handling"""
-    file_ext = os.path.splitext(filename)[1].lower()
-    try:
-        if file_ext == '.txt': return extract_text_from_txt(filename), ""
-        elif file_ext == '.md': return extract_text_from_md(filename), ""
-        elif file_ext == '.json': return extract_text_from_json(filename), ""
-        elif file_ext == '.csv': return extract_text_from_csv(filename), ""
-        elif file_ext == '.pdf': return extract_text_from_pdf(filename), ""
-        elif file_ext == '.docx': return extract_text_from_docx(filename), ""
-        elif file_ext == '.doc': 
+# ======================
+# Archive Input
+# ======================
+class ArchiveLimitError(Exception):
+    """Raised when an archive exceeds the member, size or compression-ratio limits"""
+
+# Workers are forked from a forkserver that has already imported this module and its
+# extraction libraries, so a new or recycled worker costs a fork instead of seconds of
+# imports. EXTRACTOR_WORKER_START_METHOD=spawn or fork selects the other start methods.
+WORKER_START_METHOD = os.environ.get("EXTRACTOR_WORKER_START_METHOD") or (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None)
+# Replace a worker after this many tasks, bounding memory held by extraction libraries (0 = never)
+WORKER_MAX_TASKS = int(os.environ.get("EXTRACTOR_WORKER_MAX_TASKS", 0))
+# Each worker still runs this script's top level, which is cheap once every library it
+# imports is already loaded; missing optional modules are skipped by the forkserver
+WORKER_PRELOAD_MODULES = [
+    "gradio", "numpy", "pandas", "PyPDF2", "markdown2", "docx", "openpyxl", "pptx", "ebooklib",
+    "bs4", "xlrd", "langchain_community.document_loaders.unstructured", "pdfminer.pdfinterp", "pypdfium2",
+]
+# Settings the command line changes after import; workers not created by fork don't inherit them
+WORKER_SETTINGS = ("LANGCHAIN_STRATEGY", "OCR_DPI", "NORMALIZE_TEXT", "MMAP_INPUTS")
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+def _init_worker(settings):
+    globals().update(settings)
+
+def new_worker_pool(max_workers=MAX_WORKERS, start_method=None, max_tasks=WORKER_MAX_TASKS):
+    context = multiprocessing.get_context(start_method or WORKER_START_METHOD)
+    options = {}
+    if context.get_start_method() == "forkserver":
+        # Only takes effect when the server starts, i.e. for the first forkserver pool
+        context.set_forkserver_preload(WORKER_PRELOAD_MODULES)
+    if max_tasks and context.get_start_method() != "fork":
+        options["max_tasks_per_child"] = max_tasks
+    settings = {name: globals()[name] for name in WORKER_SETTINGS}
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                               initializer=_init_worker, initargs=(settings,), **options)
+
+def get_worker_pool():
+    """Process pool shared by archive members and batch extraction"""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = new_worker_pool()
+        return _worker_pool
+
+def _worker_started():
+    return os.getpid()
+
+def benchmark_worker_startup(rounds=5):
+    """Seconds from creating a one-worker pool to its first result, for each start method
+
+    The first forkserver round also starts the server and runs the preload; the median of
+    the later rounds is what every new or recycled worker costs.
+    """
+    results = {}
+    for start_method in multiprocessing.get_all_start_methods():
+        timings = []
+        for _ in range(rounds):
+            start_time = time.perf_counter()
+            pool = new_worker_pool(1, start_method, max_tasks=0)
             try:
-                return extract_text_from_docx(filename), ""
-            except:
-                return extract_text_with_langchain(filename), "Note: Used UnstructuredFileLoader for .doc"
-        elif file_ext == '.xlsx': return extract_text_from_xlsx(filename), ""
-        elif file_ext == '.xls': return extract_text_from_xls(filename), ""
-        elif file_ext in ('.pptx', '.ppt'): return extract_text_from_pptx(filename), ""
-        elif file_ext == '.epub': return extract_text_from_epub(filename), ""
-        else: 
-            # Try with UnstructuredFileLoader as a fallback
-            return extract_text_with_langchain(filename), f"Note: Used fallback extractor for {file_ext}"
-    except Exception as e:
-        logger.error(f"Extraction error for {filename}: {str(e)}")
-        logger.error(traceback.format_exc())
-        
-        # Provide more specific error messages based on file type
-        if file_ext == '.pdf':
-            return "", f"PDF extraction error: {str(e)}. File might be encrypted, image-based, or damaged."
-        elif file_ext in ('.doc', '.docx'):
-            return "", f"Word document error: {str(e)}. File might be corrupted or password protected."
-        elif file_ext in ('.xls', '.xlsx'):
-            return "", f"Excel file error: {str(e)}. File might be corrupted or password protected."
-        elif file_ext == '.epub':
-            return "", f"EPUB error: {str(e)}. File might be corrupted or in an unsupported format."
+                pool.submit(_worker_started).result()
+                timings.append(time.perf_counter() - start_time)
+            finally:
+                pool.shutdown()
+        later = sorted(timings[1:])
+        results[start_method] = {"first": timings[0], "median": later[len(later) // 2]}
+    return results
+
+def _read_member(stream, declared_size):
+    # Never trust the declared size: read one byte past it to detect lies
+    data = stream.read(declared_size + 1)
+    if len(data) > declared_size:
+        raise ArchiveLimitError("member is larger than its declared size")
+    return data
+
+def iter_archive_members(filename):
+    """Stream (member_name, data, skip_reason) from a zip or tar archive without unpacking to disk"""
+    archive_size = max(os.path.getsize(filename), 1)
+    members = 0
+    total_bytes = 0
+
+    def count_member():
+        # Every entry counts, including directories and skipped types: a flood of entries
+        # nobody extracts still costs time to list and report
+        nonlocal members
+        members += 1
+        if members > MAX_ARCHIVE_MEMBERS:
+            raise ArchiveLimitError(f"more than {MAX_ARCHIVE_MEMBERS} members")
+
+    def check_limits(size, ratio):
+        nonlocal total_bytes
+        total_bytes += size
+        if total_bytes > MAX_ARCHIVE_TOTAL_BYTES:
+            raise ArchiveLimitError(f"uncompressed size exceeds {MAX_ARCHIVE_TOTAL_BYTES} bytes")
+        if ratio > MAX_COMPRESSION_RATIO:
+            raise ArchiveLimitError(f"compression ratio exceeds {MAX_COMPRESSION_RATIO:g}")
+
+    if get_file_ext(filename) == '.zip':
+        with zipfile.ZipFile(filename) as zf:
+            for info in zf.infolist():
+                count_member()
+                if info.is_dir():
+                    continue
+                if get_file_ext(info.filename) not in ALLOWED_EXTENSIONS:
+                    yield info.filename, None, "unsupported member type"
+                    continue
+                check_limits(info.file_size, info.file_size / max(info.compress_size, 1))
+                with zf.open(info) as stream:
+                    yield info.filename, _read_member(stream, info.file_size), ""
+    else:
+        # Stream mode reads the tar sequentially; compressed member sizes are unknown,
+        # so the ratio is checked against the whole archive
+        with tarfile.open(filename, mode='r|*') as tf:
+            for member in tf:
+                count_member()
+                if not member.isfile():
+                    continue
+                if get_file_ext(member.name) not in ALLOWED_EXTENSIONS:
+                    yield member.name, None, "unsupported member type"
+                    continue
+                check_limits(member.size, (total_bytes + member.size) / archive_size)
+                yield member.name, _read_member(tf.extractfile(member), member.size), ""
+
+def _peak_rss_probe(filename, use_mmap):
+    global MMAP_INPUTS, PAGE_CACHE_DB_PATH
+    MMAP_INPUTS = use_mmap
+    PAGE_CACHE_DB_PATH = ""  # measure real extraction, not cache reads
+    rss_before = peak_rss_bytes()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    text, _ = extract_text(filename)
+    seconds = time.perf_counter() - start_time
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": seconds, "rss_before": rss_before, "rss_after": peak_rss_bytes(),
+            "heap_peak": heap_peak, "chars": len(text)}
+
+def benchmark_input_mapping(filename):
+    """Peak RSS, Python heap peak and time of one extraction with path vs mmap input, each in a fresh process
+
+    Peak RSS also counts the mapped file pages a reader touches; those are clean page cache
+    the OS can drop under pressure, unlike the heap copies that show up in the heap peak.
+    """
+    results = {}
+    for label, use_mmap in (("path", False), ("mmap", True)):
+        with ProcessPoolExecutor(max_workers=1) as probe_pool:
+            results[label] = probe_pool.submit(_peak_rss_probe, filename, use_mmap).result()
+    return results
+
+def extract_task(filename, data=None, trace=False):
+    """Worker entry point: extract a file (or in-memory bytes), returning (text, note, segments)
+
+    `trace` is the submitter's sampling decision, so the worker traces exactly the sampled files.
+    """
+    segments = []
+    source = io.BytesIO(data) if data is not None else None
+    with trace_span("extract_task", sampled=trace):
+        text, note = extract_text(filename, source, on_segment=lambda *segment: segments.append(segment))
+    return text, note, segments
+
+def timed_extract_task(filename, data=None, trace=False):
+    """extract_task plus the seconds it took inside the worker, for cost-model tuning"""
+    start_time = time.perf_counter()
+    result = extract_task(filename, data, trace)
+    return time.perf_counter() - start_time, result
+
+def extract_pdf_pages_task(filename, start, stop, trace=False):
+    """Worker entry point for one slice of a page-split PDF: (seconds, segments, page cache stats)"""
+    start_time = time.perf_counter()
+    stats = {}
+    with trace_span("extract_pdf_pages", sampled=trace, start=start, stop=stop), \
+            mapped_input(filename, '.pdf') as source:
+        # The same pipeline as an unsplit PDF: normalized and traced page by page
+        segments = list(emit_segments(iter_pdf_segments(source, range(start, stop), stats)))
+    return time.perf_counter() - start_time, segments, stats
+
+@traced
+def extract_text_from_archive(filename, on_segment=None):
+    """Extract every supported member in parallel, reporting per member"""
+    pool = get_worker_pool()
+    pending = deque()
+    outputs = []
+    report = []
+
+    def collect(member_name, future):
+        try:
+            text, note, segments = future.result()
+        except Exception as e:
+            text, note, segments = "", str(e), []
+        if on_segment:
+            for kind, index, segment_text in segments:
+                on_segment(kind, f"{member_name}:{index}", segment_text)
+        if text:
+            # Members are headed by their path inside the archive only: results are cached by
+            # content, so the archive's own name (often a temp file) must not be baked in
+            outputs.append(f"=== {member_name} ===\n{text}\n")
+            report.append(f"✅ {member_name}" + (f" ({note})" if note else ""))
         else:
-            return "", f"Extraction error: {str(e)}"
+            report.append(f"❌ {member_name}: {note or 'No text content found'}")
 
-def save_extracted_text(filename, text):
-    """Save extracted text to file with better error handling"""
     try:
-        # Create a clean output filename
-        base_name = os.path.splitext(os.path.basename(filename))[0]
-        output_path = f"{base_name}_extracted.txt"
-        
-        # Avoid overwriting existing files
-        counter = 1
-        while os.path.exists(output_path):
-            output_path = f"{base_name}_extracted_{counter}.txt"
-            counter += 1
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(text)
-        return f"Saved to {Path(output_path).name}"
-    except Exception as e:
-        logger.error(f"Save error: {str(e)}")
-        return f"Save failed: {str(e)}"
+        for member_name, data, skip_reason in iter_archive_members(filename):
+            if skip_reason:
+                report.append(f"⏭️ {member_name}: {skip_reason}")
+                continue
+            pending.append((member_name, pool_submit(pool, extract_task, member_name, data, trace_active())))
+            # Bound the number of members held in memory at once
+            while len(pending) >= MAX_WORKERS * 2:
+                collect(*pending.popleft())
+    except (ArchiveLimitError, zipfile.BadZipFile, tarfile.TarError) as e:
+        report.append(f"⛔ Archive rejected: {str(e)}")
+        for _, future in pending:
+            future.cancel()
+        pending.clear()
+    while pending:
+        collect(*pending.popleft())
 
-def save_all_text(text, output_filename=None):
-    """Save all extracted text to a single file"""
-    try:
-        if not output_filename:
-            output_filename = "extracted_text.txt"
-            
-            # Avoid overwriting existing files
-            counter = 1
-            while os.path.exists(output_filename):
-                output_filename = f"extracted_text_{counter}.txt"
-                counter += 1
-        
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            f.write(text)
-        return f"Saved all text to {output_filename}"
-    except Exception as e:
-        logger.error(f"Save all text error: {str(e)}")
-        return f"Save failed: {str(e)}"
+    return "\n\n".join(outputs), "\n".join(report)
+
+def extract_text(filename, source=None, on_segment=None, structured=False):
+    """Main extraction router with improved error handling
+
+    `source` may be a binary file object (e.g. an archive member); it defaults to
+    `filename`, which is always used to pick the extractor. `on_segment(kind, index, text)`
+    is called for each page/sheet/slide/table/chapter as it is extracted; flat formats
+    report a single "document" segment. With `structured=True` the result is
+    (list of Segment records, note) instead of (text, note).
+    """
+    if structured:
+        segments = []
+
+        def collect(*segment):
+            segments.append(segment)
+            if on_segment:
+                on_segment(*segment)
+
+        _, note = extract_text(filename, source, collect)
+        return list(iter_segment_records(os.path.basename(filename), segments)), note
+    if source is None:
+        large = os.path.isfile(filename) and os.path.getsize(filename) >= LARGE_FILE_BYTES
+        rss_before = peak_rss_bytes() if large else None
+        with mapped_input(filename) as mapped:
+            result = extract_text(filename, mapped, on_segment)
+        if rss_before is not None:
+            logger.info(f"Peak RSS for {os.path.basename(filename)}: {rss_before / 1048576:.0f} MiB before, "
+                        f"{peak_rss_bytes() / 1048576:.0f} MiB after")
+        return result
+    file_ext = get_file_ext(filename)
+
+    def whole(text):
+        if NORMALIZE_TEXT:
+            text = text_normalizer(text)
+        if on_segment:
+            on_segment("document", 1, text)
+        return text
+
+    with trace_span("extract_text", file=os.path.basename(filename)):
+        try:
+            if file_ext in ARCHIVE_EXTENSIONS: return extract_text_from_archive(source, on_segment)
+            elif file_ext == '.txt': return whole(extract_text_from_txt(source)), ""
+            elif file_ext == '.md': return whole(extract_text_from_md(source)), ""
+            elif file_ext == '.json': return whole(extract_text_from_json(source)), ""
+            elif file_ext == '.csv': return whole(extract_text_from_csv(source)), ""
+            elif file_ext == '.pdf':
+                stats = {}
+                text = extract_text_from_pdf(source, on_segment, stats)
+                return text, page_cache_note(stats)
+            elif file_ext == '.docx': return extract_text_from_docx(source, on_segment), ""
+            elif file_ext == '.doc': 
+                try:
+                    return extract_text_from_docx(rewind_source(source), on_segment), ""
+                except:
+                    with source_as_path(source, file_ext) as path:
+                        return extract_text_with_langchain(path, on_segment=on_segment), "Note: Used UnstructuredFileLoader for .doc"
+            elif file_ext == '.xlsx': return extract_text_from_xlsx(source, on_segment), ""
+            elif file_ext == '.xls': return extract_text_from_xls(source, on_segment), ""
+            elif file_ext in ('.pptx', '.ppt'): return extract_text_from_pptx(source, on_segment), ""
+            elif file_ext == '.epub': return extract_text_from_epub(source, on_segment), ""
+            else: 
+                # Try with UnstructuredFileLoader as a fallback
+                with source_as_path(source, file_ext) as path:
+                    return extract_text_with_langchain(path, on_segment=on_segment), f"Note: Used fallback extractor for {file_ext}"
+        except Exception as e:
+            logger.error(f"Extraction error for {filename}: {str(e)}")
+            logger.error(traceback.format_exc())
+            return "", extraction_error_note(file_ext, e)
+
+def extraction_error_note(file_ext, e):
+    """User-facing message for an extraction failure, specific to the file type"""
+    if file_ext == '.pdf':
+        return f"PDF extraction error: {str(e)}. File might be encrypted, image-based, or damaged."
+    elif file_ext in ('.doc', '.docx'):
+        return f"Word document error: {str(e)}. File might be corrupted or password protected."
+    elif file_ext in ('.xls', '.xlsx'):
+        return f"Excel file error: {str(e)}. File might be corrupted or password protected."
+    elif file_ext == '.epub':
+        return f"EPUB error: {str(e)}. File might be corrupted or in an unsupported format."
+    else:
+        return f"Extraction error: {str(e)}"
 
 # ======================
-# Enhanced UI Components
+# Metrics
 # ======================
-custom_css = """
-.gradio-container {
-    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell;
-    background: #f5f5f7 !important;
-}
-.block {
-    background: white !important;
-    border-radius: 18px !important;
-    padding: 20px !important;
-    margin: 10px 0 !important;
-    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.05) !important;
-    border: 1px solid #e0e0e0 !important;
-}
-button {
-    background: #007aff !important;
-    color: white !important;
-    border-radius: 12px !important;
-    padding: 8px 16px !important;
-    border: none !important;
-    transition: all 0.2s ease;
+# Each thread updates its own dict without locking; a scrape sums the per-thread dicts.
+# Stores of finished threads are folded into one retired store as new threads register,
+# so short-lived request threads do not accumulate.
+METRIC_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+METRIC_SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB .. 1 GiB
+METRIC_HELP = {
+    "extractor_extractions_total": ("counter", "Completed extractions by format and outcome"),
+    "extractor_extraction_seconds": ("histogram", "Submit-to-result latency of extractions"),
+    "extractor_input_bytes": ("histogram", "Size of extracted input files"),
+    "extractor_output_chars": ("histogram", "Characters of extracted text"),
+    "extractor_cache_requests_total": ("counter", "Extraction requests by result cache outcome"),
+    "extractor_cache_hit_ratio": ("gauge", "Share of extraction requests served without a new extraction"),
+    "extractor_result_cache_bytes": ("gauge", "Characters held in the shared result cache"),
+    "extractor_pool_tasks_submitted_total": ("counter", "Tasks submitted to the extraction process pool"),
+    "extractor_pool_tasks_completed_total": ("counter", "Tasks finished by the extraction process pool"),
+    "extractor_pool_workers": ("gauge", "Processes in the extraction pool"),
+    "extractor_pool_utilization": ("gauge", "Share of pool processes busy (outstanding tasks / workers, capped at 1)"),
+    "extractor_pool_queued_tasks": ("gauge", "Pool tasks waiting for a free process"),
+    "extractor_inflight_extractions": ("gauge", "Distinct documents currently being extracted"),
+    "extractor_job_tasks": ("gauge", "Background job tasks by status"),
+}
+
+_metrics_local = threading.local()
+_metrics_stores = []  # [(thread, store)]
+_metrics_retired = {}
+_metrics_lock = threading.Lock()
+
+def _merge_metrics(into, store):
+    for key, value in list(store.items()):
+        if isinstance(value, list):
+            series = into.setdefault(key, [value[0], [0] * len(value[1]), 0.0])
+            series[1] = [a + b for a, b in zip(series[1], value[1])]
+            series[2] += value[2]
+        else:
+            into[key] = into.get(key, 0) + value
+
+def _thread_metrics():
+    store = getattr(_metrics_local, "store", None)
+    if store is None:
+        store = _metrics_local.store = {}
+        with _metrics_lock:
+            for entry in [entry for entry in _metrics_stores if not entry[0].is_alive()]:
+                _merge_metrics(_metrics_retired, entry[1])
+                _metrics_stores.remove(entry)
+            _metrics_stores.append((threading.current_thread(), store))
+    return store
+
+def metrics_inc(name, labels=(), value=1):
+    """Add to a counter; `labels` is a tuple of (name, value) pairs"""
+    store = _thread_metrics()
+    key = (name, labels)
+    store[key] = store.get(key, 0) + value
+
+def metrics_observe(name, value, labels=(), buckets=METRIC_LATENCY_BUCKETS):
+    store = _thread_metrics()
+    series = store.get((name, labels))
+    if series is None:
+        series = store[(name, labels)] = [buckets, [0] * (len(buckets) + 1), 0.0]
+    series[1][bisect.bisect_left(buckets, value)] += 1
+    series[2] += value
+
+def metrics_snapshot():
+    """Counters and histograms summed over all threads"""
+    with _metrics_lock:
+        merged = {}
+        _merge_metrics(merged, _metrics_retired)
+        for _, store in _metrics_stores:
+            _merge_metrics(merged, store)
+    return merged
+
+def _metric_gauges(merged):
+    requests = {dict(labels)["result"]: value for (name, labels), value in merged.items()
+                if name == "extractor_cache_requests_total"}
+    total = sum(requests.values())
+    outstanding = (merged.get(("extractor_pool_tasks_submitted_total", ()), 0)
+                   - merged.get(("extractor_pool_tasks_completed_total", ()), 0))
+    gauges = {
+        ("extractor_cache_hit_ratio", ()): (total - requests.get("miss", 0)) / total if total else 0.0,
+        ("extractor_result_cache_bytes", ()): _result_cache_bytes,
+        ("extractor_pool_workers", ()): MAX_WORKERS,
+        ("extractor_pool_utilization", ()): min(outstanding, MAX_WORKERS) / MAX_WORKERS,
+        ("extractor_pool_queued_tasks", ()): max(outstanding - MAX_WORKERS, 0),
+        ("extractor_inflight_extractions", ()): len(_inflight),
+    }
+    # Only report jobs if this process already uses the job store; a scrape never creates it
+    if _job_conn is not None:
+        with _job_lock:
+            rows = _job_conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        for status, count in rows:
+            gauges[("extractor_job_tasks", (("status", status),))] = count
+    return gauges
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels, extra=()):
+    pairs = [f'{key}="{_label_value(value)}"' for key, value in labels + extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def render_metrics():
+    """Prometheus text exposition format"""
+    merged = metrics_snapshot()
+    merged.update(_metric_gauges(merged))
+    by_name = {}
+    for (name, labels), value in merged.items():
+        by_name.setdefault(name, []).append((labels, value))
+    lines = []
+    for name in sorted(by_name):
+        metric_type, help_text = METRIC_HELP.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if metric_type != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            buckets, counts, total = value
+            cumulative = 0
+            for bound, count in zip(buckets + (float("inf"),), counts):
+                cumulative += count
+                bound_label = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound_label),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+def pool_submit(pool, function, *args):
+    """Submit to the process pool, counting the task for the utilization gauges"""
+    future = pool.submit(function, *args)
+    metrics_inc("extractor_pool_tasks_submitted_total")
+    future.add_done_callback(lambda _: metrics_inc("extractor_pool_tasks_completed_total"))
+    return future
+
+# ======================
+# Shared Result Cache
+# ======================
+CACHE_MAX_BYTES = int(os.environ.get("EXTRACTOR_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+_result_cache = OrderedDict()
+_result_cache_bytes = 0
+_inflight = {}
+_cache_lock = threading.Lock()
+# Archives fan out to the process pool themselves, so they are coordinated from threads
+_coordinator_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="archive")
+
+def _result_size(result):
+    text, _, segments = result
+    return len(text) + sum(len(segment_text) for _, _, segment_text in segments)
+
+def cache_get(key):
+    with _cache_lock:
+        result = _result_cache.get(key)
+        if result is not None:
+            _result_cache.move_to_end(key)
+        return result
+
+def cache_put(key, result):
+    """Keep a (text, note, segments) result, evicting least recently used entries past CACHE_MAX_BYTES"""
+    global _result_cache_bytes
+    size = _result_size(result)
+    if size > CACHE_MAX_BYTES:
+        return
+    with _cache_lock:
+        if key in _result_cache:
+            return
+        _result_cache[key] = result
+        _result_cache_bytes += size
+        while _result_cache_bytes > CACHE_MAX_BYTES:
+            _, evicted = _result_cache.popitem(last=False)
+            _result_cache_bytes -= _result_size(evicted)
+
+def _submit_timed(file_path, trace):
+    if get_file_ext(file_path) in ARCHIVE_EXTENSIONS:
+        inner = _coordinator_pool.submit(timed_extract_task, file_path, None, trace)
+    else:
+        inner = pool_submit(get_worker_pool(), timed_extract_task, file_path, None, trace)
+    outer = Future()
+
+    def relay(done):
+        if outer.cancelled():
+            return
+        try:
+            seconds, result = done.result()
+        except BaseException as e:
+            outer.set_exception(e)
+            return
+        outer.seconds = seconds
+        outer.set_result(result)
+
+    outer.add_done_callback(lambda f: f.cancelled() and inner.cancel())
+    inner.add_done_callback(relay)
+    return outer
+
+def _submit_pdf_split(file_path, page_count, trace):
+    """Spread one large PDF across the pool in PDF_SPLIT_PAGES slices, rendered as a single result"""
+    pool = get_worker_pool()
+    slices = [pool_submit(pool, extract_pdf_pages_task, file_path, start, min(start + PDF_SPLIT_PAGES, page_count), trace)
+              for start in range(0, page_count, PDF_SPLIT_PAGES)]
+    outer = Future()
+    remaining = [len(slices)]
+    lock = threading.Lock()
+
+    def gather(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] or outer.cancelled():
+                return
+        try:
+            parts = [done.result() for done in slices]
+        except BaseException as e:
+            logger.error(f"Extraction error for {file_path}: {str(e)}")
+            outer.seconds = 0.0
+            outer.set_result(("", extraction_error_note('.pdf', e), []))
+            return
+        segments = [segment for _, part, _ in parts for segment in part]
+        stats = {key: sum(part_stats[key] for _, _, part_stats in parts) for key in PDF_STATS_KEYS}
+        stats["backend"] = parts[-1][2]["backend"]
+        outer.seconds = sum(seconds for seconds, _, _ in parts)
+        outer.set_result((render_pdf_segments(segments), page_cache_note(stats), segments))
+
+    outer.add_done_callback(lambda f: f.cancelled() and [done.cancel() for done in slices])
+    for done in slices:
+        done.add_done_callback(gather)
+    return outer
+
+def submit_extraction(file_path, content_hash=None, page_count=None, trace=None):
+    """Future for (text, note, segments), served from the cache or shared with an identical in-flight job
+
+    PDFs whose known `page_count` exceeds PDF_SPLIT_PAGES are extracted in page slices in parallel.
+    `trace` is the sampling decision sent to the workers; by default the calling thread's trace
+    is continued, or a new decision is drawn.
+    """
+    content_hash = content_hash or hash_file(file_path)
+    # The extension picks the extractor, so identical bytes under another extension are a different result
+    key = (content_hash, get_file_ext(file_path))
+    cached = cache_get(key)
+    if cached is not None:
+        metrics_inc("extractor_cache_requests_total", (("result", "hit"),))
+        future = Future()
+        future.set_result(cached)
+        future.claims = 1
+        return future
+    with _cache_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            metrics_inc("extractor_cache_requests_total", (("result", "shared"),))
+            future.claims += 1
+            return future
+        if trace is None:
+            trace = trace_active() or trace_sampled()
+        if page_count and page_count > PDF_SPLIT_PAGES and get_file_ext(file_path) == '.pdf':
+            future = _submit_pdf_split(file_path, page_count, trace)
+        else:
+            future = _submit_timed(file_path, trace)
+        # Callers sharing the future; release_extraction() only cancels it once none are left
+        future.claims = 1
+        future.key = key
+        _inflight[key] = future
+    metrics_inc("extractor_cache_requests_total", (("result", "miss"),))
+    labels = (("format", get_file_ext(file_path)),)
+    metrics_observe("extractor_input_bytes", os.path.getsize(file_path), labels, METRIC_SIZE_BUCKETS)
+    start_time = time.perf_counter()
+
+    def settle(done):
+        with _cache_lock:
+            if _inflight.get(key) is done:
+                del _inflight[key]
+        if done.cancelled() or done.exception() is not None:
+            outcome = "cancelled" if done.cancelled() else "error"
+            metrics_inc("extractor_extractions_total", labels + (("outcome", outcome),))
+            return
+        text = done.result()[0]
+        metrics_inc("extractor_extractions_total", labels + (("outcome", "ok" if text else "failed"),))
+        metrics_observe("extractor_extraction_seconds", time.perf_counter() - start_time, labels)
+        metrics_observe("extractor_output_chars", len(text), labels, METRIC_SIZE_BUCKETS)
+        if text:
+            cache_put(key, done.result())
+
+    future.add_done_callback(settle)
+    return future
+
+def release_extraction(future):
+    """Drop one caller's claim on a submit_extraction future, cancelling it if it was the last"""
+    with _cache_lock:
+        future.claims -= 1
+        if future.claims > 0:
+            return False
+        # Unpublish before cancelling, so a concurrent submit_extraction cannot join a future
+        # that is about to be cancelled; cancel() runs settle(), which takes the lock itself
+        key = getattr(future, "key", None)
+        if _inflight.get(key) is future:
+            del _inflight[key]
+    return future.cancel()
+
+def extract_with_cache(file_path, content_hash=None):
+    """Blocking form of submit_extraction"""
+    return submit_extraction(file_path, content_hash).result()
+
+# ======================
+# Cost Estimation & Scheduling
+# ======================
+COST_MODEL_PATH = os.environ.get("EXTRACTOR_COST_MODEL", "extraction_cost_model.json")
+# PDFs with more pages than this are extracted in slices of this many pages
+PDF_SPLIT_PAGES = int(os.environ.get("EXTRACTOR_PDF_SPLIT_PAGES", 200))
+# Weight of each new measurement when tuning the per-extension coefficients
+COST_LEARNING_RATE = 0.2
+COST_BASE_SECONDS = 0.01
+
+# Work is counted in whatever unit can be read without extracting: pages, cells, slides, else MiB
+COST_UNITS = {'.pdf': 'page', '.xlsx': 'cell', '.pptx': 'slide'}
+# Seconds per unit, keyed "ext/unit"; tuned from measured runs and persisted in COST_MODEL_PATH
+DEFAULT_COST_COEFFICIENTS = {
+    '.pdf/page': 0.02, '.xlsx/cell': 0.00002, '.pptx/slide': 0.01,
+    '.docx/MiB': 0.5, '.doc/MiB': 2.0, '.xls/MiB': 1.0, '.epub/MiB': 0.3, '.ppt/MiB': 2.0,
+    '.txt/MiB': 0.02, '.md/MiB': 0.05, '.json/MiB': 0.2, '.csv/MiB': 0.5,
+}
+DEFAULT_COST_PER_MIB = 2.0
+
+_cost_model = None
+_cost_lock = threading.Lock()
+
+def count_pdf_pages(file_path):
+    # /Root -> /Pages -> /Count from the trailer, without walking the page tree
+    with mapped_input(file_path, '.pdf') as source:
+        return int(PdfReader(source, strict=False).trailer["/Root"]["/Pages"]["/Count"])
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+def count_xlsx_cells(file_path):
+    """Sum of the sheets' <dimension> ranges, read from the head of each worksheet part"""
+    cells = 0
+    with zipfile.ZipFile(file_path) as zf:
+        for name in zf.namelist():
+            if not re.fullmatch(r"xl/worksheets/sheet\d+\.xml", name):
+                continue
+            with zf.open(name) as part:
+                head = part.read(4096).decode('utf-8', errors='ignore')
+            match = re.search(r'<dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"', head)
+            if match:
+                first_col, first_row, last_col, last_row = match.groups()
+                rows = int(last_row or first_row) - int(first_row) + 1
+                cols = _column_number(last_col or first_col) - _column_number(first_col) + 1
+                cells += rows * cols
+    return cells
+
+def count_pptx_slides(file_path):
+    with zipfile.ZipFile(file_path) as zf:
+        return sum(1 for name in zf.namelist() if re.fullmatch(r"ppt/slides/slide\d+\.xml", name))
+
+def measure_work(file_path):
+    """(units, unit) of work in a file, falling back to MiB when metadata can't be read"""
+    file_ext = get_file_ext(file_path)
+    unit = COST_UNITS.get(file_ext)
+    try:
+        if unit == 'page':
+            return count_pdf_pages(file_path), unit
+        if unit == 'cell':
+            return count_xlsx_cells(file_path), unit
+        if unit == 'slide':
+            return count_pptx_slides(file_path), unit
+    except Exception as e:
+        logger.warning(f"Could not read work size of {file_path}: {str(e)}")
+    return os.path.getsize(file_path) / (1024 * 1024), 'MiB'
+
+def get_cost_model():
+    global _cost_model
+    with _cost_lock:
+        if _cost_model is None:
+            _cost_model = {}
+            if os.path.exists(COST_MODEL_PATH):
+                try:
+                    with open(COST_MODEL_PATH, 'r', encoding='utf-8') as f:
+                        _cost_model = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignoring unreadable cost model {COST_MODEL_PATH}: {str(e)}")
+        return _cost_model
+
+def _cost_key(file_ext, unit):
+    return f"{file_ext}/{unit}"
+
+def estimate_cost(file_path):
+    """Predicted extraction seconds with the work measure behind it: {"seconds", "units", "unit"}"""
+    units, unit = measure_work(file_path)
+    key = _cost_key(get_file_ext(file_path), unit)
+    coefficient = get_cost_model().get(key, DEFAULT_COST_COEFFICIENTS.get(key, DEFAULT_COST_PER_MIB))
+    return {"seconds": COST_BASE_SECONDS + coefficient * units, "units": units, "unit": unit}
+
+def record_actual_cost(file_path, estimate, seconds):
+    """Move the file type's coefficient toward the measured seconds per unit"""
+    # Very short runs are dominated by per-file overhead and say little about the per-unit rate
+    if estimate["units"] <= 0 or seconds < 5 * COST_BASE_SECONDS:
+        return
+    key = _cost_key(get_file_ext(file_path), estimate["unit"])
+    observed = max(seconds - COST_BASE_SECONDS, 0.0) / estimate["units"]
+    current = (estimate["seconds"] - COST_BASE_SECONDS) / estimate["units"]
+    model = get_cost_model()
+    with _cost_lock:
+        model[key] = (1 - COST_LEARNING_RATE) * model.get(key, current) + COST_LEARNING_RATE * observed
+
+def save_cost_model():
+    model = get_cost_model()
+    with _cost_lock:
+        payload = json.dumps(model, indent=2, sort_keys=True)
+    write_text_atomic(COST_MODEL_PATH, payload)
+
+def schedule_extractions(items, traces=None):
+    """Submit (file_path, content_hash) pairs longest-predicted-first; returns [(future, estimate)] in input order
+
+    `traces` optionally maps file paths to the sampling decisions already drawn for them.
+
+    Dispatching the expensive files first keeps every worker busy until the end of the batch
+    instead of leaving one large file running alone after the small ones have drained.
+    """
+    estimates = [estimate_cost(file_path) for file_path, _ in items]
+    futures = [None] * len(items)
+    for i in sorted(range(len(items)), key=lambda i: estimates[i]["seconds"], reverse=True):
+        file_path, content_hash = items[i]
+        page_count = estimates[i]["units"] if estimates[i]["unit"] == 'page' else None
+        futures[i] = submit_extraction(file_path, content_hash, page_count, (traces or {}).get(file_path))
+    return list(zip(futures, estimates))
+
+# ======================
+# Speculative Extraction
+# ======================
+# Files are hashed and submitted as soon as they are uploaded, so by the time "Extract Text"
+# is clicked their results are usually in the cache or already in flight
+SPECULATIVE_EXTRACTION = os.environ.get("EXTRACTOR_SPECULATE", "1") != "0"
+UPLOAD_HASH_ENTRIES = 4096
+
+_upload_hashes = OrderedDict()  # path -> ((size, mtime_ns), content hash)
+_speculative = {}  # path -> future of a speculative submission still running
+_speculative_lock = threading.Lock()
+
+def upload_hash(file_path):
+    """hash_file, remembered per path for as long as the file's size and mtime are unchanged"""
+    stat = os.stat(file_path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _speculative_lock:
+        entry = _upload_hashes.get(file_path)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+    content_hash = hash_file(file_path)
+    with _speculative_lock:
+        _upload_hashes[file_path] = (key, content_hash)
+        _upload_hashes.move_to_end(file_path)
+        while len(_upload_hashes) > UPLOAD_HASH_ENTRIES:
+            _upload_hashes.popitem(last=False)
+    return content_hash
+
+def speculate_extractions(paths):
+    """Hash and submit uploaded files ahead of the user asking; returns how many were started"""
+    with _speculative_lock:
+        paths = [path for path in paths if path not in _speculative]
+    batch = [(path, upload_hash(path)) for path in paths if validate_file(path)[0]]
+    for (path, _), (future, _) in zip(batch, schedule_extractions(batch)):
+        with _speculative_lock:
+            _speculative[path] = future
+        future.add_done_callback(lambda done, path=path: _forget_speculation(path, done))
+    return len(batch)
+
+def _forget_speculation(path, future):
+    with _speculative_lock:
+        if _speculative.get(path) is future:
+            del _speculative[path]
+
+def cancel_speculation(paths):
+    """Withdraw the speculative claims on `paths`; work nobody else is waiting for is cancelled"""
+    cancelled = 0
+    for path in paths:
+        with _speculative_lock:
+            future = _speculative.pop(path, None)
+            _upload_hashes.pop(path, None)
+        if future is not None and release_extraction(future):
+            cancelled += 1
+    return cancelled
+
+# ======================
+# Segment Streaming & Chunking
+# ======================
+SEGMENT_READERS = {
+    '.pdf': iter_pdf_segments,
+    '.docx': iter_docx_segments,
+    '.xlsx': iter_xlsx_segments,
+    '.xls': iter_xls_segments,
+    '.pptx': iter_pptx_segments,
+    '.ppt': iter_pptx_segments,
+    '.epub': iter_epub_segments,
+}
+FLAT_READERS = {
+    '.txt': extract_text_from_txt,
+    '.md': extract_text_from_md,
+    '.json': extract_text_from_json,
+    '.csv': extract_text_from_csv,
+}
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+def iter_langchain_segments(source, file_ext):
+    with source_as_path(source, file_ext) as path:
+        for i, element_text in enumerate(iter_text_with_langchain(path)):
+            yield "element", i + 1, element_text
+
+def iter_segments(filename, source=None):
+    """Yield (kind, index, text) segments as each is extracted, never building the full text
+
+    Called with a path, segments are normalized (when enabled) on their way out.
+    """
+    if source is None:
+        with mapped_input(filename) as mapped:
+            yield from normalize_segments(iter_segments(filename, mapped))
+        return
+    file_ext = get_file_ext(filename)
+    if file_ext in ARCHIVE_EXTENSIONS:
+        for member_name, data, skip_reason in iter_archive_members(source):
+            if skip_reason:
+                continue
+            for kind, index, text in iter_segments(member_name, io.BytesIO(data)):
+                yield kind, f"{member_name}:{index}", text
+    elif file_ext == '.doc':
+        try:
+            segments = list(iter_docx_segments(rewind_source(source)))
+        except Exception:
+            segments = None
+        yield from segments if segments is not None else iter_langchain_segments(source, file_ext)
+    elif file_ext in SEGMENT_READERS:
+        yield from SEGMENT_READERS[file_ext](source)
+    elif file_ext in FLAT_READERS:
+        yield "document", 1, FLAT_READERS[file_ext](source)
+    else:
+        yield from iter_langchain_segments(source, file_ext)
+
+def iter_chunks(segments, source_name, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Split a segment stream into overlapping chunks of at most `chunk_size` characters
+
+    Chunks never span segments, so page/sheet/slide boundaries are preserved.
+    `start`/`end` are offsets within the segment; `doc_start`/`doc_end` are offsets
+    into the concatenation of all segment texts of the document.
+    """
+    if not 0 <= overlap < chunk_size:
+        raise ValueError("overlap must be at least 0 and smaller than chunk_size")
+    doc_offset = 0
+    for kind, index, text in segments:
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_size, len(text))
+            if end < len(text):
+                # Prefer to break on whitespace in the second half of the window
+                cut = max(text.rfind(' ', start + chunk_size // 2, end), text.rfind('\n', start + chunk_size // 2, end))
+                if cut > start:
+                    end = cut + 1
+            yield {
+                "source": source_name,
+                "kind": kind,
+                "index": index,
+                "start": start,
+                "end": end,
+                "doc_start": doc_offset + start,
+                "doc_end": doc_offset + end,
+                "text": text[start:end],
+            }
+            if end >= len(text):
+                break
+            start = max(end - overlap, start + 1)
+        doc_offset += len(text)
+
+def write_chunks_jsonl(filenames, output_path, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Extract, chunk and write JSONL for several files in a single streaming pass"""
+    count = 0
+    with atomic_output(output_path) as out:
+        for filename in filenames:
+            source_name = os.path.basename(filename)
+            try:
+                for chunk in iter_chunks(iter_segments(filename), source_name, chunk_size, overlap):
+                    out.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                    count += 1
+            except Exception as e:
+                logger.error(f"Chunking failed for {filename}: {str(e)}")
+    return count
+
+# ======================
+# Structured Segments
+# ======================
+# The segments extract_text() renders with "--- Page N ---" style markers, as records that
+# consumers can use directly instead of re-parsing the rendered text
+Segment = namedtuple("Segment", ["source", "kind", "index", "text", "metadata"])
+
+def iter_segment_records(source_name, segments):
+    """Wrap (kind, index, text) segments as Segment records
+
+    metadata holds `doc_start`/`doc_end` offsets into the concatenation of all segment
+    texts (as in iter_chunks) and, for archive members, the `member` name.
+    """
+    doc_offset = 0
+    for kind, index, text in segments:
+        metadata = {"doc_start": doc_offset, "doc_end": doc_offset + len(text)}
+        if isinstance(index, str) and ":" in index:
+            metadata["member"] = index.rsplit(":", 1)[0]
+        yield Segment(source_name, kind, index, text, metadata)
+        doc_offset += len(text)
+
+def segment_to_json(segment):
+    return json.dumps(segment._asdict(), ensure_ascii=False)
+
+def write_segments_jsonl(filenames, output_path):
+    """Extract and write one Segment record per line for several files in a single streaming pass"""
+    count = 0
+    with atomic_output(output_path) as out:
+        for filename in filenames:
+            try:
+                for segment in iter_segment_records(os.path.basename(filename), iter_segments(filename)):
+                    out.write(segment_to_json(segment) + "\n")
+                    count += 1
+            except Exception as e:
+                logger.error(f"Segment export failed for {filename}: {str(e)}")
+    return count
+
+def extract_segment(filename, kind, index):
+    """Random access to a single segment, or None if the file has no such segment
+
+    A PDF page is extracted on its own; other formats are streamed and stop at the match.
+    The record's metadata is empty, as offsets would need the preceding segments.
+    """
+    source_name = os.path.basename(filename)
+    if get_file_ext(filename) == '.pdf' and kind == "page":
+        with mapped_input(filename, '.pdf') as source:
+            if not 1 <= index <= len(PdfReader(source).pages):
+                return None
+            segments = normalize_segments(iter_pdf_segments(rewind_source(source), range(index - 1, index)))
+            for segment_kind, segment_index, text in segments:
+                if segment_kind == kind:
+                    return Segment(source_name, kind, index, text, {})
+        return None
+    segments = iter_segments(filename)
+    try:
+        for segment_kind, segment_index, text in segments:
+            if segment_kind == kind and str(segment_index) == str(index):
+                return Segment(source_name, kind, segment_index, text, {})
+    finally:
+        segments.close()
+    return None
+
+# ======================
+# Budgeted Preview
+# ======================
+# A preview reads segments until one of these budgets runs out, so its latency depends on
+# the budget rather than the file size; the full extraction runs separately in the pool
+PREVIEW_MAX_SEGMENTS = int(os.environ.get("EXTRACTOR_PREVIEW_SEGMENTS", 5))
+PREVIEW_MAX_CHARS = int(os.environ.get("EXTRACTOR_PREVIEW_CHARS", 20000))
+PREVIEW_MAX_ROWS = int(os.environ.get("EXTRACTOR_PREVIEW_ROWS", 100))
+TRUNCATION_MARKER = "[… preview truncated — full extraction continues in the background …]"
+
+# Keyed by the kind of the first segment rather than the extension: a .doc is read either
+# as DOCX parts or, failing that, as LangChain elements, which the DOCX renderer would mislabel
+SEGMENT_RENDERERS = {
+    'page': render_pdf_segments,
+    'form': render_pdf_segments,
+    'properties': render_docx_segments,
+    'content': render_docx_segments,
+    'table': render_docx_segments,
+    'sheet': render_sheets,
+    'slide': render_pptx_segments,
+    'metadata': render_epub_segments,
+    'chapter': render_epub_segments,
+}
+
+def render_segments(segments):
+    """Render a segment stream the way its full extraction would, or join it for other kinds"""
+    first = next(segments, None)
+    if first is None:
+        return ""
+    renderer = SEGMENT_RENDERERS.get(first[0])
+    segments = itertools.chain([first], segments)
+    if renderer is None:
+        return "\n\n".join(segment_text for _, _, segment_text in segments)
+    return renderer(segments)
+
+def iter_budgeted(segments, max_segments, max_chars, stats):
+    """Pass segments through until a budget is spent, then stop the reader and set stats["truncated"]
+
+    Reading on to find out whether anything is left would cost another page, so a
+    document that ends exactly at the budget is also reported as truncated.
+    """
+    chars = 0
+    for count, segment in enumerate(segments, 1):
+        chars += len(segment[2])
+        yield segment
+        if count >= max_segments or chars >= max_chars:
+            stats["truncated"] = True
+            segments.close()
+            return
+
+def extract_preview(filename, max_segments=PREVIEW_MAX_SEGMENTS, max_chars=PREVIEW_MAX_CHARS,
+                    max_rows=PREVIEW_MAX_ROWS):
+    """Partial text within the page/sheet/slide, character and row budgets: (text, truncated)"""
+    file_ext = get_file_ext(filename)
+    stats = {}
+    if file_ext == '.csv':
+        # One extra row tells whether there is more
+        text = extract_text_from_csv(filename, max_rows + 1)
+        lines = (text_normalizer(text) if NORMALIZE_TEXT else text).splitlines()
+        stats["truncated"] = len(lines) > max_rows + 1
+        text = "\n".join(lines[:max_rows + 1])
+    elif file_ext in ('.xlsx', '.xls'):
+        with mapped_input(filename) as source:
+            reader = normalize_segments(SEGMENT_READERS[file_ext](source, max_rows=max_rows, stats=stats))
+            text = render_sheets(iter_budgeted(reader, max_segments, max_chars, stats))
+    elif file_ext not in ARCHIVE_EXTENSIONS:
+        text = render_segments(iter_budgeted(iter_segments(filename), max_segments, max_chars, stats))
+    else:
+        segments = iter_budgeted(iter_segments(filename), max_segments, max_chars, stats)
+        text = "\n\n".join(segment_text for _, _, segment_text in segments)
+    if len(text) > max_chars:
+        text = text[:max_chars]
+        stats["truncated"] = True
+    truncated = stats.get("truncated", False)
+    return (f"{text}\n\n{TRUNCATION_MARKER}" if truncated else text), truncated
+
+# ======================
+# Full-Text Search Index
+# ======================
+INDEX_DB_PATH = os.environ.get("EXTRACTOR_INDEX_DB", "extracted_index.sqlite3")
+
+_index_conn = None
+_index_lock = threading.Lock()
+
+def get_index_connection():
+    """Shared SQLite connection holding the document table and the FTS5 segment index"""
+    global _index_conn
+    with _index_lock:
+        if _index_conn is None:
+            conn = sqlite3.connect(INDEX_DB_PATH, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    content_hash TEXT NOT NULL UNIQUE,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS segments USING fts5(
+                    text, kind UNINDEXED, segment UNINDEXED, document_id UNINDEXED
+                );
+            """)
+            _index_conn = conn
+        return _index_conn
+
+def hash_file(filename, chunk_size=1024 * 1024):
+    """SHA-256 of a file's bytes, read in chunks"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def index_document(name, content_hash, segments):
+    """Add a document's segments to the index; content already indexed is skipped"""
+    conn = get_index_connection()
+    with _index_lock, conn:
+        row = conn.execute("SELECT id FROM documents WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row:
+            return False
+        document_id = conn.execute(
+            "INSERT INTO documents (name, content_hash, indexed_at) VALUES (?, ?, ?)",
+            (name, content_hash, time.time())
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO segments (text, kind, segment, document_id) VALUES (?, ?, ?, ?)",
+            ((text, kind, str(index), document_id) for kind, index, text in segments if text.strip())
+        )
+    return True
+
+def _quote_fts_query(query):
+    # Treat every whitespace-separated term as a literal phrase, ANDed together
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+def search_index(query, limit=20):
+    """Ranked (name, kind, segment, snippet, score) hits for a full-text query"""
+    if not query or not query.strip():
+        return []
+    conn = get_index_connection()
+    # Top-k is taken inside FTS5 (ORDER BY rank LIMIT), so snippets are built only for the hits
+    sql = """
+        SELECT d.name, s.kind, s.segment, s.snippet, s.rank
+        FROM (SELECT kind, segment, document_id, rank,
+                     snippet(segments, 0, '**', '**', ' … ', 16) AS snippet
+              FROM segments WHERE segments MATCH ? ORDER BY rank LIMIT ?) AS s
+        JOIN documents d ON d.id = s.document_id
+        ORDER BY s.rank
+    """
+    with _index_lock:
+        try:
+            return conn.execute(sql, (query, limit)).fetchall()
+        except sqlite3.OperationalError:
+            # Not valid FTS5 syntax; fall back to plain terms
+            return conn.execute(sql, (_quote_fts_query(query), limit)).fetchall()
+
+# ======================
+# Vector Similarity Index
+# ======================
+VECTOR_INDEX_DIR = os.environ.get("EXTRACTOR_VECTOR_DIR", "vector_index")
+# float16 rows of 1024 buckets: 2 KiB per chunk, ~2 GiB on disk for 1M chunks
+VECTOR_DIM = 1024
+VECTOR_GROW_ROWS = 65536
+VECTOR_QUERY_BLOCK = 16384
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def hash_vectorize(texts, dim=VECTOR_DIM):
+    """Hashing-trick term vectors (signed bucket counts), L2-normalised, one row per text"""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        if not tokens:
+            continue
+        hashes = np.fromiter((zlib.crc32(token.encode('utf-8')) for token in tokens),
+                             dtype=np.uint32, count=len(tokens))
+        # One hash bit picks the sign so colliding terms tend to cancel instead of pile up
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(matrix[row], hashes % dim, signs)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+class VectorIndex:
+    """Append-only, memory-mapped matrix of chunk vectors with TF-IDF weighted search
+
+    Rows hold normalised term vectors; document frequencies per bucket are kept
+    separately and IDF is applied to the query (squared, standing in for both sides),
+    so stored rows never need rewriting as the corpus grows. Chunk metadata lives
+    in the index database, keyed by row number.
+    """
+
+    def __init__(self, directory=VECTOR_INDEX_DIR, dim=VECTOR_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.matrix_path = os.path.join(directory, "vectors.f16")
+        self.state_path = os.path.join(directory, "state.json")
+        self.df_path = os.path.join(directory, "df.npy")
+        state = {"rows": 0, "capacity": 0}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        self.rows = state["rows"]
+        self.capacity = state["capacity"]
+        self.df = np.load(self.df_path) if os.path.exists(self.df_path) else np.zeros(dim, dtype=np.int64)
+        self.matrix = self._map(self.capacity) if self.capacity else None
+        conn = get_index_connection()
+        with _index_lock, conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS vector_chunks (
+                    row INTEGER PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    segment TEXT NOT NULL,
+                    start INTEGER NOT NULL,
+                    preview TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS vector_documents (content_hash TEXT PRIMARY KEY);
+            """)
+
+    def _map(self, capacity):
+        mode = 'r+' if os.path.exists(self.matrix_path) else 'w+'
+        return np.memmap(self.matrix_path, dtype=np.float16, mode=mode, shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows):
+        if rows <= self.capacity:
+            return
+        new_capacity = max(rows, self.capacity + VECTOR_GROW_ROWS)
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.matrix = None
+        with open(self.matrix_path, 'ab') as f:
+            f.truncate(new_capacity * self.dim * 2)
+        self.capacity = new_capacity
+        self.matrix = self._map(new_capacity)
+
+    def _save_state(self):
+        self.matrix.flush()
+        np.save(self.df_path, self.df)
+        write_text_atomic(self.state_path, json.dumps({"rows": self.rows, "capacity": self.capacity}))
+
+    def add_chunks(self, chunks):
+        """Append chunk dicts (as produced by iter_chunks) to the index"""
+        chunks = list(chunks)
+        if not chunks:
+            return 0
+        vectors = hash_vectorize([chunk["text"] for chunk in chunks], self.dim)
+        with self.lock:
+            first = self.rows
+            self._ensure_capacity(first + len(chunks))
+            self.matrix[first:first + len(chunks)] = vectors
+            self.df += (vectors != 0).sum(axis=0)
+            self.rows += len(chunks)
+            self._save_state()
+        conn = get_index_connection()
+        with _index_lock, conn:
+            conn.executemany(
+                "INSERT INTO vector_chunks (row, source, kind, segment, start, preview) VALUES (?, ?, ?, ?, ?, ?)",
+                ((first + i, chunk["source"], chunk["kind"], str(chunk["index"]), chunk["start"], chunk["text"][:200])
+                 for i, chunk in enumerate(chunks))
+            )
+        return len(chunks)
+
+    def add_document(self, name, content_hash, segments):
+        """Chunk and index a document's segments once per distinct content"""
+        conn = get_index_connection()
+        with _index_lock, conn:
+            if conn.execute("SELECT 1 FROM vector_documents WHERE content_hash = ?", (content_hash,)).fetchone():
+                return 0
+            # Claimed up front so concurrent uploads of the same content index it only once
+            conn.execute("INSERT INTO vector_documents (content_hash) VALUES (?)", (content_hash,))
+        try:
+            return self.add_chunks(iter_chunks(segments, name))
+        except BaseException:
+            # Release the claim, or the document could never be indexed again
+            with _index_lock, conn:
+                conn.execute("DELETE FROM vector_documents WHERE content_hash = ?", (content_hash,))
+            raise
+
+    def search(self, queries, k=10):
+        """Top-k (score, metadata) per query text, scored by batched block-wise matrix products"""
+        with self.lock:
+            rows = self.rows
+            if not rows:
+                return [[] for _ in queries]
+            idf = np.log((1 + rows) / (1 + self.df.astype(np.float32))) + 1
+            weighted = hash_vectorize(queries, self.dim) * (idf * idf)
+            best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+            best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+            for start in range(0, rows, VECTOR_QUERY_BLOCK):
+                block = np.asarray(self.matrix[start:min(start + VECTOR_QUERY_BLOCK, rows)], dtype=np.float32)
+                scores = weighted @ block.T
+                take = min(k, scores.shape[1])
+                top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+                best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+                best_rows = np.concatenate([best_rows, top + start], axis=1)
+                if best_scores.shape[1] > k:
+                    keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                    best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+        conn = get_index_connection()
+        results = []
+        with _index_lock:
+            for scores, row_ids in zip(best_scores, best_rows):
+                hits = []
+                for score, row in zip(scores, row_ids):
+                    meta = conn.execute(
+                        "SELECT source, kind, segment, start, preview FROM vector_chunks WHERE row = ?", (int(row),)
+                    ).fetchone()
+                    if meta and score > 0:
+                        hits.append((float(score), dict(zip(("source", "kind", "segment", "start", "preview"), meta))))
+                results.append(hits)
+        return results
+
+_vector_index = None
+_vector_index_lock = threading.Lock()
+
+def get_vector_index():
+    """Vector index shared by every request; opened on first use"""
+    global _vector_index
+    with _vector_index_lock:
+        if _vector_index is None:
+            _vector_index = VectorIndex()
+        return _vector_index
+
+def find_similar(texts, k=10):
+    """Python API: top-k similar indexed chunks for one text or a list of texts"""
+    if isinstance(texts, str):
+        return get_vector_index().search([texts], k)[0]
+    return get_vector_index().search(list(texts), k)
+
+# ======================
+# Near-Duplicate Detection
+# ======================
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 128
+# 32 bands of 4 rows: pairs around 0.8 Jaccard collide in some band with ~99.9% probability
+MINHASH_BANDS = 32
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("EXTRACTOR_NEAR_DUPLICATE_THRESHOLD", 0.85))
+_MINHASH_BLOCK = 8192
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# Fixed seed: signatures are persisted and must stay comparable across runs
+_minhash_rng = np.random.RandomState(20240227)
+_MINHASH_A = _minhash_rng.randint(1, 1 << 31, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+_MINHASH_B = _minhash_rng.randint(0, 1 << 31, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+
+def shingle_hashes(text, size=SHINGLE_WORDS):
+    """Distinct 32-bit hashes of overlapping word n-grams, combined with NumPy
+
+    Texts shorter than `size` words form a single shingle of all their words.
+    """
+    tokens = text.lower().split()
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    token_hashes = np.fromiter((zlib.crc32(token.encode('utf-8')) for token in tokens),
+                               dtype=np.uint64, count=len(tokens))
+    size = min(size, len(tokens))
+    count = len(tokens) - size + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        # Polynomial rolling hash; uint64 arithmetic wraps, which is fine for hashing
+        combined = combined * np.uint64(1000003) + token_hashes[offset:offset + count]
+    return np.unique(combined & np.uint64(0xFFFFFFFF))
+
+def minhash_signature(text):
+    """MinHash signature: per permutation, the minimum of (a * h + b) mod p over all shingles
+
+    Returns None for text without words, which has no shingles to sign.
+    """
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return None
+    signature = np.full(MINHASH_PERMUTATIONS, _MERSENNE_PRIME, dtype=np.uint64)
+    for start in range(0, len(hashes), _MINHASH_BLOCK):
+        block = hashes[start:start + _MINHASH_BLOCK]
+        permuted = (np.outer(_MINHASH_A, block) + _MINHASH_B[:, None]) % _MERSENNE_PRIME
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature
+
+def _lsh_buckets(signature):
+    rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    for band in range(MINHASH_BANDS):
+        digest = hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest()
+        yield band, int.from_bytes(digest, 'little', signed=True)
+
+def _ensure_minhash_tables(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS minhash_signatures (
+            content_hash TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            signature BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS minhash_bands (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            content_hash TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS minhash_bands_lookup ON minhash_bands (band, bucket);
+    """)
+
+def check_near_duplicate(name, content_hash, text, register=True):
+    """Return (name, estimated Jaccard) of the closest earlier document above the threshold, or None
+
+    Candidates come from LSH band buckets (indexed lookups, not a scan of history);
+    only they are compared signature-to-signature. Unless a duplicate is found, the
+    document's signature is stored for later batches when `register` is set. Text
+    without words is never a duplicate and is not stored.
+    """
+    signature = minhash_signature(text)
+    if signature is None:
+        return None
+    buckets = list(_lsh_buckets(signature))
+    conn = get_index_connection()
+    with _index_lock, conn:
+        _ensure_minhash_tables(conn)
+        candidates = set()
+        for band, bucket in buckets:
+            candidates.update(row[0] for row in conn.execute(
+                "SELECT content_hash FROM minhash_bands WHERE band = ? AND bucket = ?", (band, bucket)))
+        # Re-uploading the same bytes is not a near-duplicate of itself
+        candidates.discard(content_hash)
+        best = None
+        for candidate in candidates:
+            candidate_name, blob = conn.execute(
+                "SELECT name, signature FROM minhash_signatures WHERE content_hash = ?", (candidate,)).fetchone()
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint64) == signature))
+            if similarity >= NEAR_DUPLICATE_THRESHOLD and (best is None or similarity > best[1]):
+                best = (candidate_name, similarity)
+        if best is None and register and conn.execute(
+                "INSERT OR IGNORE INTO minhash_signatures (content_hash, name, signature) VALUES (?, ?, ?)",
+                (content_hash, name, signature.tobytes())).rowcount:
+            conn.executemany("INSERT INTO minhash_bands (band, bucket, content_hash) VALUES (?, ?, ?)",
+                             ((band, bucket, content_hash) for band, bucket in buckets))
+    return best
+
+def register_extraction(name, content_hash, text, segments, collapse_duplicates=False):
+    """Post-extraction hook shared by every ingestion path; returns check_near_duplicate's result
+
+    Registers the document for near-duplicate detection and adds it to the full-text and
+    vector indexes. With `collapse_duplicates`, a near-duplicate is left out of the indexes.
+    Index failures are logged, never raised: the extraction itself has already succeeded.
+    """
+    try:
+        duplicate = check_near_duplicate(name, content_hash, text)
+    except sqlite3.Error as e:
+        logger.error(f"Near-duplicate check failed for {name}: {str(e)}")
+        duplicate = None
+    if duplicate and collapse_duplicates:
+        return duplicate
+    try:
+        index_document(name, content_hash, segments)
+        get_vector_index().add_document(name, content_hash, segments)
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Indexing error for {name}: {str(e)}")
+    return duplicate
+
+# ======================
+# Output Management
+# ======================
+OUTPUT_DIR = os.environ.get("EXTRACTOR_OUTPUT_DIR", "extracted_outputs")
+
+@contextmanager
+def atomic_output(output_path):
+    """Open a temp file in the target directory for writing; rename it into place on success"""
+    directory = os.path.dirname(output_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            yield f
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_text_atomic(output_path, text):
+    """Write text via a temp file in the target directory, then rename it into place"""
+    with atomic_output(output_path) as f:
+        f.write(text)
+    return output_path
+
+def store_output(base_name, text):
+    """Store text under a content-hash name in a sharded subdirectory of OUTPUT_DIR.
+
+    The name is derived from the content, so there is nothing to probe for: identical
+    text maps to the same file and different text never collides. Shards are two
+    levels of two hex digits (65,536 directories), keeping each directory small.
+    """
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    output_path = os.path.join(OUTPUT_DIR, digest[:2], digest[2:4], f"{base_name}_{digest[:16]}.txt")
+    if not os.path.exists(output_path):
+        write_text_atomic(output_path, text)
+    return output_path
+
+def save_extracted_text(filename, text):
+    """Save extracted text to file with better error handling"""
+    try:
+        base_name = os.path.splitext(os.path.basename(filename))[0]
+        with trace_span("save_extracted_text", sampled=trace_sampled(), chars=len(text)):
+            output_path = store_output(f"{base_name}_extracted", text)
+        return f"Saved to {output_path}"
+    except Exception as e:
+        logger.error(f"Save error: {str(e)}")
+        return f"Save failed: {str(e)}"
+
+def save_all_text(text, output_filename=None):
+    """Save all extracted text to a single file"""
+    try:
+        with trace_span("save_all_text", sampled=trace_sampled(), chars=len(text)):
+            if output_filename:
+                # An explicit name is honoured as given, replacing any previous file atomically
+                output_path = write_text_atomic(output_filename, text)
+            else:
+                output_path = store_output("extracted_text", text)
+        return f"Saved all text to {output_path}"
+    except Exception as e:
+        logger.error(f"Save all text error: {str(e)}")
+        return f"Save failed: {str(e)}"
+
+# ======================
+# Persistent Job Queue
+# ======================
+JOB_DB_PATH = os.environ.get("EXTRACTOR_JOB_DB", "extraction_jobs.sqlite3")
+# Job inputs are hardlinked (or copied) here so they outlive upload temp directories
+JOB_SPOOL_DIR = os.environ.get("EXTRACTOR_JOB_SPOOL", "extraction_jobs_spool")
+JOB_WORKERS = int(os.environ.get("EXTRACTOR_JOB_WORKERS", MAX_WORKERS))
+
+_job_conn = None
+_job_lock = threading.Lock()
+_job_wakeup = threading.Event()
+_job_threads = []
+
+def get_job_connection():
+    """Shared connection to the job store; interrupted tasks are re-queued on first use"""
+    global _job_conn
+    with _job_lock:
+        if _job_conn is None:
+            conn = sqlite3.connect(JOB_DB_PATH, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    job_id TEXT NOT NULL REFERENCES jobs(id),
+                    position INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    note TEXT NOT NULL DEFAULT '',
+                    output_path TEXT,
+                    started_at REAL,
+                    finished_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (status, id);
+                CREATE INDEX IF NOT EXISTS tasks_by_job ON tasks (job_id, position);
+            """)
+            # A task left 'running' was cut off by a restart; completed tasks are never re-run
+            with conn:
+                conn.execute("UPDATE tasks SET status = 'pending', started_at = NULL WHERE status = 'running'")
+            _job_conn = conn
+        return _job_conn
+
+def _spool_job_input(path, job_id, position):
+    target_dir = os.path.join(JOB_SPOOL_DIR, job_id)
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, f"{position}_{os.path.basename(path)}")
+    with trace_span("spool_job_input", sampled=trace_sampled()):
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copy2(path, target)
+    return target
+
+def _release_job_input(path):
+    """Delete a finished task's spooled input, and the job's spool directory once it is empty"""
+    spool_dir = os.path.abspath(JOB_SPOOL_DIR)
+    if not path or os.path.commonpath([spool_dir, os.path.abspath(path)]) != spool_dir:
+        return
+    try:
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass  # other tasks of the job still hold inputs, or the file is already gone
+
+def submit_job(paths, names=None):
+    """Queue a batch as one job with a task per file; returns the job id
+
+    Files that fail validation are recorded as failed tasks and never spooled.
+    """
+    conn = get_job_connection()
+    job_id = uuid.uuid4().hex
+    names = names or [os.path.basename(path) for path in paths]
+    rows = []
+    for position, (name, path) in enumerate(zip(names, paths)):
+        valid, valid_msg = validate_file(path)
+        if valid:
+            rows.append((job_id, position, name, _spool_job_input(path, job_id, position), "pending", ""))
+        else:
+            rows.append((job_id, position, name, "", "failed", valid_msg))
+    with _job_lock, conn:
+        conn.execute("INSERT INTO jobs (id, created_at) VALUES (?, ?)", (job_id, time.time()))
+        conn.executemany("INSERT INTO tasks (job_id, position, name, path, status, note) VALUES (?, ?, ?, ?, ?, ?)",
+                         rows)
+    start_job_workers()
+    _job_wakeup.set()
+    return job_id
+
+def _claim_task():
+    conn = get_job_connection()
+    with _job_lock, conn:
+        row = conn.execute(
+            "SELECT id, name, path FROM tasks WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+        if row:
+            conn.execute("UPDATE tasks SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row[0]))
+        return row
+
+def _finish_task(task_id, status, note, output_path=None):
+    conn = get_job_connection()
+    with _job_lock, conn:
+        conn.execute("UPDATE tasks SET status = ?, note = ?, output_path = ?, finished_at = ? WHERE id = ?",
+                     (status, note, output_path, time.time(), task_id))
+
+def _job_worker_loop():
+    while True:
+        task = _claim_task()
+        if task is None:
+            _job_wakeup.wait(timeout=5)
+            _job_wakeup.clear()
+            continue
+        task_id, name, path = task
+        try:
+            valid, valid_msg = validate_file(path)
+            if not valid:
+                _finish_task(task_id, "failed", valid_msg)
+                continue
+            content_hash = hash_file(path)
+            text, note, segments = extract_with_cache(path, content_hash)
+            if text:
+                # Names of JSON-submitted inputs are paths; only the base name belongs in the store
+                base_name = os.path.basename(name)
+                register_extraction(base_name, content_hash, text, segments)
+                output_path = store_output(f"{os.path.splitext(base_name)[0]}_extracted", text)
+                _finish_task(task_id, "done", note, output_path)
+            else:
+                _finish_task(task_id, "failed", note or "No text content found")
+        except Exception as e:
+            logger.error(f"Job task {task_id} ({name}) failed: {str(e)}")
+            _finish_task(task_id, "failed", str(e))
+        finally:
+            _release_job_input(path)
+
+def start_job_workers(count=None):
+    """Start the job worker threads once; pending tasks from earlier runs are picked up"""
+    with _job_lock:
+        if _job_threads:
+            return
+        for i in range(count or JOB_WORKERS):
+            thread = threading.Thread(target=_job_worker_loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            _job_threads.append(thread)
+
+def job_status(job_id):
+    """Progress counts and per-task state for a job, or None if unknown"""
+    conn = get_job_connection()
+    with _job_lock:
+        if not conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone():
+            return None
+        tasks = conn.execute(
+            "SELECT name, status, note, output_path FROM tasks WHERE job_id = ? ORDER BY position", (job_id,)
+        ).fetchall()
+    counts = {state: 0 for state in ("pending", "running", "done", "failed")}
+    for _, state, _, _ in tasks:
+        counts[state] += 1
+    return {
+        "job_id": job_id,
+        "total": len(tasks),
+        **counts,
+        "tasks": [{"name": name, "status": state, "note": note, "output_path": output_path}
+                  for name, state, note, output_path in tasks],
+    }
+
+def job_results(job_id):
+    """Concatenated text of a job's completed tasks, in submission order"""
+    status = job_status(job_id)
+    if status is None:
+        return None
+    outputs = []
+    for task in status["tasks"]:
+        if task["status"] == "done":
+            try:
+                with open(task["output_path"], 'r', encoding='utf-8') as f:
+                    outputs.append(f"=== {task['name']} ===\n{f.read()}\n")
+            except OSError as e:
+                outputs.append(f"=== {task['name']} ===\n[Output unavailable: {str(e)}]\n")
+    return "\n\n".join(outputs)
+
+# ======================
+# Distributed Work Queue
+# ======================
+# A directory on a shared filesystem acts as the broker for workers on several hosts:
+#   pending/  task files waiting for a worker
+#   leased/   tasks held by a worker; the file's mtime is the lease heartbeat
+#   done/     result records (outputs themselves go to the OUTPUT_DIR store)
+#   failed/   tasks that errored or exceeded QUEUE_MAX_ATTEMPTS
+#   inputs/   content-addressed copies of the enqueued files
+# Every state change is a single os.rename, which is atomic on one filesystem, so exactly
+# one worker wins each lease or reclaim.
+QUEUE_LEASE_SECONDS = float(os.environ.get("EXTRACTOR_QUEUE_LEASE_SECONDS", 120))
+QUEUE_HEARTBEAT_SECONDS = float(os.environ.get("EXTRACTOR_QUEUE_HEARTBEAT_SECONDS", 15))
+QUEUE_MAX_ATTEMPTS = int(os.environ.get("EXTRACTOR_QUEUE_MAX_ATTEMPTS", 3))
+QUEUE_STATES = ("pending", "leased", "done", "failed", "inputs")
+
+def _queue_path(queue_dir, state, task_file=""):
+    return os.path.join(queue_dir, state, task_file)
+
+def _write_task_file(path, task):
+    # Temp file in the same directory, then rename: readers never see a partial task
+    write_text_atomic(path, json.dumps(task))
+
+def _read_task_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def init_queue(queue_dir):
+    for state in QUEUE_STATES:
+        os.makedirs(_queue_path(queue_dir, state), exist_ok=True)
+
+def enqueue_files(queue_dir, paths):
+    """Copy files into the queue and add a pending task for each; returns the task file names"""
+    init_queue(queue_dir)
+    task_files = []
+    for path in paths:
+        content_hash = hash_file(path)
+        input_path = _queue_path(queue_dir, "inputs", content_hash + get_file_ext(path))
+        if not os.path.exists(input_path):
+            tmp_path = input_path + f".{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, input_path)
+        # Time-prefixed names keep the queue roughly first-in, first-out
+        task_file = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.json"
+        _write_task_file(_queue_path(queue_dir, "pending", task_file), {
+            "name": os.path.basename(path),
+            "input": os.path.basename(input_path),
+            "content_hash": content_hash,
+            "attempts": 0,
+        })
+        task_files.append(task_file)
+    return task_files
+
+def lease_task(queue_dir):
+    """Atomically move the oldest pending task into leased/; returns its file name or None"""
+    for task_file in sorted(os.listdir(_queue_path(queue_dir, "pending"))):
+        if not task_file.endswith(".json"):
+            continue
+        pending_path = _queue_path(queue_dir, "pending", task_file)
+        try:
+            # Renames keep the mtime, so start the lease clock before the task becomes leased
+            os.utime(pending_path)
+            os.rename(pending_path, _queue_path(queue_dir, "leased", task_file))
+        except FileNotFoundError:
+            continue  # another worker got there first
+        return task_file
+    return None
+
+def _claim_lease(leased_path, task_file, kind):
+    """Rename a leased file to a claim only this worker holds; FileNotFoundError if it lost the race"""
+    claim_path = os.path.join(os.path.dirname(leased_path), f"{task_file}.{uuid.uuid4().hex}.{kind}")
+    # Renames keep the mtime: refresh it first so the claim's age is its own, not the lease's
+    os.utime(leased_path)
+    os.rename(leased_path, claim_path)
+    return claim_path
+
+def _stranded_claim_task(queue_dir, name):
+    """Task file name of a claim whose worker died before finishing it, or None"""
+    if not name.endswith((".reclaim", ".complete")) or ".json." not in name:
+        return None
+    task_file = name[:name.index(".json.") + len(".json")]
+    # The task was already written to its next state; only the claim's unlink was lost
+    if any(os.path.exists(_queue_path(queue_dir, state, task_file)) for state in ("pending", "leased", "done", "failed")):
+        try:
+            os.unlink(_queue_path(queue_dir, "leased", name))
+        except FileNotFoundError:
+            pass
+        return None
+    return task_file
+
+def reclaim_expired_leases(queue_dir, lease_seconds=QUEUE_LEASE_SECONDS):
+    """Return tasks whose lease heartbeat stopped to pending/, or to failed/ after too many attempts
+
+    Claims left behind by a worker that died mid-reclaim or mid-completion are treated the
+    same way once they are as old as a lease.
+    """
+    reclaimed = 0
+    now = time.time()
+    for name in os.listdir(_queue_path(queue_dir, "leased")):
+        leased_path = _queue_path(queue_dir, "leased", name)
+        try:
+            if now - os.stat(leased_path).st_mtime < lease_seconds:
+                continue
+            task_file = name if name.endswith(".json") else _stranded_claim_task(queue_dir, name)
+            if task_file is None:
+                continue
+            # Claim the expired lease first so only one worker rewrites it
+            claim_path = _claim_lease(leased_path, task_file, "reclaim")
+        except FileNotFoundError:
+            continue
+        task = _read_task_file(claim_path)
+        task["attempts"] += 1
+        state = "failed" if task["attempts"] >= QUEUE_MAX_ATTEMPTS else "pending"
+        if state == "failed":
+            task["note"] = f"lease expired {task['attempts']} times"
+        _write_task_file(_queue_path(queue_dir, state, task_file), task)
+        os.unlink(claim_path)
+        logger.warning(f"Reclaimed expired lease {task_file} -> {state}")
+        reclaimed += 1
+    return reclaimed
+
+def complete_task(queue_dir, task_file, task, state):
+    """Record a result in done/ or failed/ and release the lease; False if the lease was lost"""
+    try:
+        # Taking the lease away first means a reclaimer can no longer requeue it meanwhile
+        claim_path = _claim_lease(_queue_path(queue_dir, "leased", task_file), task_file, "complete")
+    except FileNotFoundError:
+        logger.warning(f"Lease on {task_file} expired before completion; result discarded")
+        return False
+    _write_task_file(_queue_path(queue_dir, state, task_file), task)
+    os.unlink(claim_path)
+    return True
+
+def process_queue_task(queue_dir, task_file):
+    task = _read_task_file(_queue_path(queue_dir, "leased", task_file))
+    input_path = _queue_path(queue_dir, "inputs", task["input"])
+    start_time = time.perf_counter()
+    try:
+        text, note, segments = extract_with_cache(input_path, task["content_hash"])
+    except Exception as e:
+        text, note, segments = "", str(e), []
+    task.update(note=note, worker=f"{socket.gethostname()}:{os.getpid()}",
+                seconds=round(time.perf_counter() - start_time, 3))
+    if text:
+        register_extraction(task["name"], task["content_hash"], text, segments)
+        task["output_path"] = store_output(f"{os.path.splitext(task['name'])[0]}_extracted", text)
+        return complete_task(queue_dir, task_file, task, "done")
+    task["note"] = note or "No text content found"
+    return complete_task(queue_dir, task_file, task, "failed")
+
+def queue_counts(queue_dir):
+    return {state: sum(1 for name in os.listdir(_queue_path(queue_dir, state)) if name.endswith(".json"))
+            for state in QUEUE_STATES if state != "inputs"}
+
+def run_queue_worker(queue_dir, threads=MAX_WORKERS, exit_when_idle=False):
+    """Lease and process tasks until stopped (or, with exit_when_idle, until the queue is drained)"""
+    init_queue(queue_dir)
+    held = set()
+    held_lock = threading.Lock()
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(QUEUE_HEARTBEAT_SECONDS):
+            with held_lock:
+                leases = list(held)
+            for task_file in leases:
+                try:
+                    os.utime(_queue_path(queue_dir, "leased", task_file))
+                except FileNotFoundError:
+                    pass
+            try:
+                reclaim_expired_leases(queue_dir)
+            except (OSError, ValueError, KeyError) as e:
+                # A bad task file or a hiccup on the shared filesystem must not stop the heartbeat
+                logger.error(f"Reclaiming expired leases failed: {str(e)}")
+
+    def work():
+        while not stop.is_set():
+            task_file = lease_task(queue_dir)
+            if task_file is None:
+                if exit_when_idle and not any(queue_counts(queue_dir)[state] for state in ("pending", "leased")):
+                    return
+                time.sleep(1)
+                continue
+            with held_lock:
+                held.add(task_file)
+            try:
+                process_queue_task(queue_dir, task_file)
+            except Exception as e:
+                logger.error(f"Queue task {task_file} failed: {str(e)}")
+            finally:
+                with held_lock:
+                    held.discard(task_file)
+
+    reclaim_expired_leases(queue_dir)
+    heartbeat_thread = threading.Thread(target=heartbeat, name="queue-heartbeat", daemon=True)
+    heartbeat_thread.start()
+    workers = [threading.Thread(target=work, name=f"queue-worker-{i}", daemon=True) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    finally:
+        stop.set()
+
+# ======================
+# Watch Folder
+# ======================
+# `--watch DIR` turns the app into an ingestion daemon: inotify reports files closed after
+# writing (or moved in), each path waits WATCH_DEBOUNCE_SECONDS without further events so
+# partial and repeated writes settle, then it is extracted through the worker pool. The
+# event loop sleeps in poll() until an event arrives or a debounce deadline is due.
+WATCH_DEBOUNCE_SECONDS = float(os.environ.get("EXTRACTOR_WATCH_DEBOUNCE_SECONDS", 1.0))
+# Outputs written next to their inputs carry this suffix and are never ingested themselves
+WATCH_OUTPUT_SUFFIX = ".extracted.txt"
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+def watch_output_path(path, watch_dir, output_dir=None):
+    """Output next to the input, or at the same relative path under `output_dir`"""
+    if output_dir is None:
+        return path + WATCH_OUTPUT_SUFFIX
+    return os.path.join(output_dir, os.path.relpath(path, watch_dir) + ".txt")
+
+def process_watched_file(path, output_path):
+    try:
+        if not validate_file(path)[0]:
+            return
+        content_hash = hash_file(path)
+        text, note, segments = extract_with_cache(path, content_hash)
+        if not text:
+            logger.error(f"Watch: no text extracted from {path}: {note or 'No text content found'}")
+            return
+        register_extraction(os.path.basename(path), content_hash, text, segments)
+        write_text_atomic(output_path, text)
+        logger.info(f"Watch: {path} -> {output_path}")
+    except Exception as e:
+        logger.error(f"Watch: failed to process {path}: {str(e)}")
+
+class FolderWatcher:
+    """Recursive inotify watch of a directory tree feeding new files to the extraction pool"""
+
+    def __init__(self, watch_dir, output_dir=None, debounce=WATCH_DEBOUNCE_SECONDS, threads=MAX_WORKERS):
+        if not INOTIFY_SUPPORT:
+            raise RuntimeError("Watch mode needs Linux inotify")
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.output_dir = os.path.abspath(output_dir) if output_dir else None
+        self.debounce = debounce
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}  # watch descriptor -> directory
+        self.pending = OrderedDict()  # path -> debounce deadline, oldest deadline first
+        # Hashing and waiting on results happen in these threads, never in the event loop
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="watch")
+        self.wake_r, self.wake_w = os.pipe()
+        self.stopped = False
+
+    def _wanted(self, path):
+        name = os.path.basename(path)
+        if name.startswith(".") or name.startswith("~$") or name.endswith(WATCH_OUTPUT_SUFFIX):
+            return False
+        if self.output_dir and (path + os.sep).startswith(self.output_dir + os.sep):
+            return False
+        file_ext = get_file_ext(path)
+        return file_ext in ALLOWED_EXTENSIONS or file_ext in ARCHIVE_EXTENSIONS
+
+    def _is_stale(self, path):
+        try:
+            return os.path.getmtime(watch_output_path(path, self.watch_dir, self.output_dir)) < os.path.getmtime(path)
+        except OSError:
+            return True
+
+    def add_tree(self, directory, catch_up=True):
+        """Watch `directory` and its subdirectories, queueing files whose output is missing or older"""
+        for root, dirs, files in os.walk(directory):
+            if self.output_dir and (root + os.sep).startswith(self.output_dir + os.sep):
+                dirs[:] = []
+                continue
+            wd = _libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                hint = " (raise fs.inotify.max_user_watches)" if error == errno.ENOSPC else ""
+                logger.error(f"Watch: cannot watch {root}: {os.strerror(error)}{hint}")
+                continue
+            self.directories[wd] = root
+            if catch_up:
+                for name in files:
+                    path = os.path.join(root, name)
+                    if self._wanted(path) and self._is_stale(path):
+                        self._touch(path)
+
+    def remove_tree(self, directory):
+        """Stop watching `directory` and its subdirectories and forget their queued files"""
+        prefix = directory + os.sep
+        for wd, root in list(self.directories.items()):
+            if root == directory or root.startswith(prefix):
+                _libc.inotify_rm_watch(self.fd, wd)
+                del self.directories[wd]
+        for path in [path for path in self.pending if path.startswith(prefix)]:
+            del self.pending[path]
+
+    def _touch(self, path):
+        self.pending[path] = time.monotonic() + self.debounce
+        self.pending.move_to_end(path)
+
+    def _read_events(self):
+        while True:
+            try:
+                data = os.read(self.fd, 1024 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                self._handle(wd, mask, name)
+
+    def _handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            # The kernel dropped events; the stale-output check recovers whatever they were
+            logger.warning("Watch: inotify queue overflowed, rescanning")
+            self.add_tree(self.watch_dir)
+            return
+        if mask & IN_IGNORED:
+            self.directories.pop(wd, None)
+            return
+        directory = self.directories.get(wd)
+        if directory is None:
+            return
+        if mask & (IN_MOVE_SELF | IN_DELETE_SELF):
+            # Subdirectories are handled through their parent's events; only the root matters here
+            if directory == self.watch_dir:
+                logger.error(f"Watch: {self.watch_dir} was moved or deleted, stopping")
+                self.stopped = True
+            return
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            # A watch follows its directory when it moves, so a moved subtree is unwatched under
+            # the old name and rescanned under the new one (its outputs may be missing there)
+            if mask & IN_MOVED_FROM:
+                self.remove_tree(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                self.add_tree(path)
+        elif mask & IN_MOVED_FROM:
+            self.pending.pop(path, None)
+        elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self._wanted(path):
+            self._touch(path)
+
+    def _dispatch_due(self):
+        now = time.monotonic()
+        while self.pending:
+            path, deadline = next(iter(self.pending.items()))
+            if deadline > now:
+                return int((deadline - now) * 1000) + 1
+            del self.pending[path]
+            self.pool.submit(process_watched_file, path, watch_output_path(path, self.watch_dir, self.output_dir))
+        return None
+
+    def run(self):
+        self.add_tree(self.watch_dir)
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        poller.register(self.wake_r, select.POLLIN)
+        logger.info(f"Watching {self.watch_dir} ({len(self.directories)} directories)")
+        try:
+            while not self.stopped:
+                for fd, _ in poller.poll(self._dispatch_due()):
+                    if fd == self.fd:
+                        self._read_events()
+        finally:
+            os.close(self.fd)
+            os.close(self.wake_r)
+            os.close(self.wake_w)
+            # Files already being extracted finish; those still queued are dropped and,
+            # their outputs being stale, picked up by the catch-up scan of the next run
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def stop(self):
+        """Ask run() to return; safe to call from a signal handler"""
+        self.stopped = True
+        try:
+            os.write(self.wake_w, b"x")
+        except OSError:
+            pass  # run() has already closed the pipe
+
+# ======================
+# HTTP Extraction API
+# ======================
+API_HOST = os.environ.get("EXTRACTOR_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("EXTRACTOR_API_PORT", 7861))
+API_MAX_UPLOAD_BYTES = int(os.environ.get("EXTRACTOR_API_MAX_UPLOAD_BYTES", 512 * 1024 * 1024))
+# Server-side paths are only accepted beneath this directory; unset disables them
+API_PATH_ROOT = os.environ.get("EXTRACTOR_API_PATH_ROOT") or None
+
+class ExtractionAPIHandler(BaseHTTPRequestHandler):
+    """POST /extract[?format=text|jsonl] with multipart files or a JSON {"paths": [...]} body
+
+    Results are streamed back with chunked transfer encoding, one file at a time, through
+    the same worker pool and result cache as the UI. GET /metrics serves Prometheus metrics.
+    """
+    protocol_version = "HTTP/1.1"
+    server_version = "FileTextExtractor/3.0"
+
+    def log_message(self, format, *args):
+        logger.debug(f"API {self.address_string()} - {format % args}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        payload = data.encode('utf-8')
+        if payload:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+
+    def _read_inputs(self, content_type, body, tmp_dir):
+        """(display name, path on disk, content hash or None, validation error) per requested file"""
+        inputs = []
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=email.policy.HTTP).parsebytes(
+                b"Content-Type: " + content_type.encode('latin-1') + b"\r\n\r\n" + body
+            )
+            for i, part in enumerate(message.iter_parts()):
+                name = part.get_filename()
+                if not name:
+                    continue
+                data = part.get_payload(decode=True) or b""
+                # Keep the original extension: it selects the extractor
+                path = os.path.join(tmp_dir, f"upload_{i}{get_file_ext(name)}")
+                with open(path, 'wb') as f:
+                    f.write(data)
+                valid, valid_msg = validate_file(path)
+                inputs.append((os.path.basename(name), path, hashlib.sha256(data).hexdigest(), valid_msg))
+        elif content_type.startswith("application/json"):
+            if not API_PATH_ROOT:
+                raise ValueError("server-side paths are disabled (set EXTRACTOR_API_PATH_ROOT)")
+            root = os.path.realpath(API_PATH_ROOT)
+            payload = json.loads(body)
+            paths = payload.get("paths", []) if isinstance(payload, dict) else None
+            if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+                raise ValueError('expected a JSON object of the form {"paths": ["...", ...]}')
+            for path in paths:
+                real_path = os.path.realpath(path)
+                if os.path.commonpath([root, real_path]) != root:
+                    inputs.append((path, real_path, None, "path is outside the allowed root"))
+                    continue
+                valid, valid_msg = validate_file(real_path)
+                inputs.append((path, real_path, None, valid_msg))
+        else:
+            raise ValueError("expected multipart/form-data or application/json")
+        return inputs
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/metrics":
+            body = render_metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path.startswith("/jobs/") and path.endswith("/results"):
+            results = job_results(path[len("/jobs/"):-len("/results")])
+            if results is None:
+                self._send_json(404, {"error": "unknown job"})
+                return
+            body = results.encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path.startswith("/jobs/"):
+            status = job_status(path[len("/jobs/"):])
+            self._send_json(200 if status else 404, status or {"error": "unknown job"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _submit_job(self, length):
+        tmp_dir = tempfile.mkdtemp(prefix="extract-api-")
+        try:
+            inputs = self._read_inputs(self.headers.get("Content-Type", ""), self.rfile.read(length), tmp_dir)
+            errors = {name: error for name, _, _, error in inputs if error}
+            if errors:
+                # Nothing is spooled unless every input passed validation (including the path root)
+                self._send_json(400, {"error": "invalid inputs", "files": errors})
+                return
+            # Inputs are spooled into the job store, so the request's temp files can go
+            job_id = submit_job([path for _, path, _, _ in inputs], [name for name, _, _, _ in inputs])
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._send_json(202, {"job_id": job_id, "status_url": f"/jobs/{job_id}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path not in ("/extract", "/jobs"):
+            self._send_json(404, {"error": "not found"})
+            return
+        output_format = parse_qs(url.query).get("format", ["text"])[0]
+        if output_format not in ("text", "jsonl"):
+            self._send_json(400, {"error": "format must be 'text' or 'jsonl'"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > API_MAX_UPLOAD_BYTES:
+            self.close_connection = True
+            self._send_json(413, {"error": f"request body exceeds {API_MAX_UPLOAD_BYTES} bytes"})
+            return
+        if url.path == "/jobs":
+            self._submit_job(length)
+            return
+
+        tmp_dir = tempfile.mkdtemp(prefix="extract-api-")
+        try:
+            try:
+                inputs = self._read_inputs(self.headers.get("Content-Type", ""), self.rfile.read(length), tmp_dir)
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+
+            # Submit everything up front so files extract in parallel; stream results in request order
+            jobs = []
+            for name, path, content_hash, error in inputs:
+                if error:
+                    jobs.append((name, None, None, error))
+                    continue
+                # Server-side paths arrive unhashed; the indexes need the hash too
+                content_hash = content_hash or hash_file(path)
+                jobs.append((name, content_hash, submit_extraction(path, content_hash), error))
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson" if output_format == "jsonl" else "text/plain; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for name, content_hash, future, error in jobs:
+                if future is not None:
+                    try:
+                        text, note, segments = future.result()
+                    except Exception as e:
+                        text, note, segments = "", str(e), []
+                    error = "" if text else (note or "No text content found")
+                    if text:
+                        register_extraction(os.path.basename(name), content_hash, text, segments)
+                if output_format == "jsonl":
+                    if error:
+                        self._write_chunk(json.dumps({"source": name, "error": error}, ensure_ascii=False) + "\n")
+                    else:
+                        self._write_chunk("".join(
+                            segment_to_json(segment) + "\n" for segment in iter_segment_records(name, segments)
+                        ))
+                elif error:
+                    self._write_chunk(f"=== {name} ===\n[Error: {error}]\n\n")
+                else:
+                    self._write_chunk(f"=== {name} ===\n{text}\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def start_api_server(host=API_HOST, port=API_PORT):
+    """Serve the extraction API from a background thread next to the Gradio UI"""
+    server = ThreadingHTTPServer((host, port), ExtractionAPIHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="extraction-api", daemon=True).start()
+    logger.info(f"Extraction API listening on http://{host}:{server.server_address[1]}/extract")
+    return server
+
+# ======================
+# Enhanced UI Components
+# ======================
+custom_css = """
+.gradio-container {
+    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell;
+    background: #f5f5f7 !important;
+}
+.block {
+    background: white !important;
+    border-radius: 18px !important;
+    padding: 20px !important;
+    margin: 10px 0 !important;
+    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.05) !important;
+    border: 1px solid #e0e0e0 !important;
+}
+button {
+    background: #007aff !important;
+    color: white !important;
+    border-radius: 12px !important;
+    padding: 8px 16px !important;
+    border: none !important;
+    transition: all 0.2s ease;
 }
 button:hover {
     opacity: 0.9 !important;
@@ -381,41 +3583,66 @@ def create_ui():
     with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as demo:
         # Header Section
         gr.Markdown("# 📁 File Text Extractor")
-        gr.Markdown("Extract text content from various file formats. Supported formats: PDF, DOCX, XLSX, PPTX, EPUB, TXT, and more.")
-
-        # File Input Section
-        with gr.Row():
-            with gr.Column(scale=3):
-                file_input = gr.File(
-                    label="Select Files",
-                    file_count="multiple",
-                    file_types=list(ALLOWED_EXTENSIONS),
-                    elem_classes="upload-button"
-                )
-            with gr.Column(scale=1):
-                gr.Markdown("### Actions")
-                with gr.Row():
-                    extract_btn = gr.Button("Extract Text", variant="primary")
-                    clear_btn = gr.Button("Clear All")
-
-        # Processing Status
-        status_box = gr.Markdown("## Status: Ready")
-
-        # Preview Section with built-in copy button
-        preview_box = gr.Textbox(
-            label="Extracted Text Preview",
-            interactive=True,
-            lines=25,
-            elem_classes="preview-box",
-            show_copy_button=True
-        )
+        gr.Markdown("Extract text content from various file formats. Supported formats: PDF, DOCX, XLSX, PPTX, EPUB, TXT, and more, also inside ZIP/TAR archives.")
+
+        with gr.Tab("Extract"):
+            # File Input Section
+            with gr.Row():
+                with gr.Column(scale=3):
+                    file_input = gr.File(
+                        label="Select Files",
+                        file_count="multiple",
+                        file_types=list(ALLOWED_EXTENSIONS | ARCHIVE_EXTENSIONS),
+                        elem_classes="upload-button"
+                    )
+                with gr.Column(scale=1):
+                    gr.Markdown("### Actions")
+                    with gr.Row():
+                        extract_btn = gr.Button("Extract Text", variant="primary")
+                        clear_btn = gr.Button("Clear All")
+                    preview_btn = gr.Button("Quick Preview, Then Extract")
+                    job_btn = gr.Button("Submit as Background Job")
+                    collapse_duplicates = gr.Checkbox(label="Skip near-duplicate documents", value=False)
+
+            # Processing Status
+            status_box = gr.Markdown("## Status: Ready")
+
+            # Preview Section with built-in copy button
+            preview_box = gr.Textbox(
+                label="Extracted Text Preview",
+                interactive=True,
+                lines=25,
+                elem_classes="preview-box",
+                show_copy_button=True
+            )
         
-        # Save Button (new addition)
-        with gr.Row():
-            save_btn = gr.Button("Save Extracted Text", variant="primary", elem_classes="save-button")
-            save_filename = gr.Textbox(label="Save Filename (optional)", placeholder="extracted_text.txt")
+            # Save Button (new addition)
+            with gr.Row():
+                save_btn = gr.Button("Save Extracted Text", variant="primary", elem_classes="save-button")
+                save_filename = gr.Textbox(label="Save Filename (optional)", placeholder="extracted_text.txt")
         
-        save_status = gr.Markdown("") # To show save status
+            save_status = gr.Markdown("") # To show save status
+
+        with gr.Tab("Search"):
+            with gr.Row():
+                search_query = gr.Textbox(label="Search extracted documents", placeholder="e.g. invoice total", scale=4)
+                search_btn = gr.Button("Search", variant="primary", scale=1)
+            search_results = gr.Markdown("")
+
+        with gr.Tab("Similar"):
+            with gr.Row():
+                similar_query = gr.Textbox(label="Find passages similar to", lines=4, scale=4)
+                with gr.Column(scale=1):
+                    similar_k = gr.Slider(1, 50, value=10, step=1, label="Results")
+                    similar_btn = gr.Button("Find Similar", variant="primary")
+            similar_results = gr.Markdown("")
+
+        with gr.Tab("Jobs"):
+            with gr.Row():
+                job_id_box = gr.Textbox(label="Job ID", placeholder="Submit a job from the Extract tab", scale=4)
+                poll_btn = gr.Button("Refresh", variant="primary", scale=1)
+            job_status_box = gr.Markdown("")
+            job_results_box = gr.Textbox(label="Completed Results", lines=15, show_copy_button=True)
 
         # Footer
         gr.Markdown("---\n*Built with Gradio • iOS-inspired design • v3.0*")
@@ -423,7 +3650,7 @@ def create_ui():
         # ======================
         # Event Handling
         # ======================
-        def process_files(files):
+        def process_files(files, collapse_duplicates=False):
             if not files:
                 return {
                     status_box: "## Status: No files selected",
@@ -434,32 +3661,78 @@ def create_ui():
             status = []
             total = len(files)
             
+            # Validate everything first so the whole batch can be scheduled longest-first
+            validation = {}
+            batch = []
+            # One sampling decision per file, shared by its spans here and in the workers
+            traces = {}
+            for file_info in files:
+                sampled = traces[file_info.name] = trace_sampled()
+                with trace_span("prepare_file", sampled=sampled, file=Path(file_info.name).name):
+                    valid, valid_msg = validate_file(file_info.name)
+                    validation[file_info.name] = valid_msg
+                    if valid:
+                        with trace_span("hash_file"):
+                            batch.append((file_info.name, upload_hash(file_info.name)))
+            scheduled = dict(zip((file_path for file_path, _ in batch), schedule_extractions(batch, traces)))
+            hashes = dict(batch)
+            predicted_total = actual_total = 0.0
+            # Identical uploads share one future; its worker time is only counted once
+            measured = set()
+            
             for idx, file_info in enumerate(files, 1):
                 file_path = file_info.name
                 filename = Path(file_path).name
                 base_msg = f"**Processing {idx}/{total}:** `{filename}`"
                 
                 # Validation
-                valid, valid_msg = validate_file(file_path)
-                if not valid:
-                    status.append(f"{base_msg}\n❌ Validation failed: {valid_msg}")
+                if file_path not in scheduled:
+                    status.append(f"{base_msg}\n❌ Validation failed: {validation[file_path]}")
                     continue
                 
                 # Extraction
                 try:
-                    text, note = extract_text(file_path)
+                    content_hash = hashes[file_path]
+                    future, estimate = scheduled[file_path]
+                    with trace_span("wait_for_extraction", sampled=traces[file_path]):
+                        text, note, segments = future.result()
+                    # Worker seconds travel on the future; cache hits have none to report
+                    seconds = getattr(future, "seconds", None)
+                    if seconds is not None and future not in measured:
+                        measured.add(future)
+                        record_actual_cost(file_path, estimate, seconds)
+                        predicted_total += estimate["seconds"]
+                        actual_total += seconds
+                        base_msg += (f" — ⏱️ predicted {estimate['seconds']:.2f}s "
+                                     f"({estimate['units']:.4g} {estimate['unit']}), took {seconds:.2f}s")
                     if not text:
-                        status.append(f"{base_msg}\n❌ Extraction failed: No text content found")
+                        status.append(f"{base_msg}\n❌ Extraction failed: {note or 'No text content found'}")
+                        continue
+                    
+                    # Keep the search and similarity indexes current as each file completes
+                    duplicate = register_extraction(filename, content_hash, text, segments, collapse_duplicates)
+                    if duplicate and collapse_duplicates:
+                        status.append(f"{base_msg}\n⏭️ Skipped: near-duplicate of `{duplicate[0]}` "
+                                      f"({duplicate[1]:.0%} similar)")
                         continue
-                        
+                    
                     outputs.append(f"=== {filename} ===\n{text}\n")
                     status_message = f"{base_msg}\n✅ Success"
+                    if duplicate:
+                        status_message += f"\n⚠️ Near-duplicate of `{duplicate[0]}` ({duplicate[1]:.0%} similar)"
                     if note:
                         status_message += f"\nℹ️ {note}"
                     status.append(status_message)
                 except Exception as e:
                     status.append(f"{base_msg}\n❌ Extraction failed: {str(e)}")
             
+            if actual_total:
+                status.append(f"**Cost model:** predicted {predicted_total:.2f}s of work, measured {actual_total:.2f}s")
+                try:
+                    save_cost_model()
+                except OSError as e:
+                    logger.error(f"Could not save cost model: {str(e)}")
+            
             if not outputs:
                 return {
                     status_box: "\n\n".join(status),
@@ -471,6 +3744,55 @@ def create_ui():
                 preview_box: "\n\n".join(outputs)
             }
         
+        def preview_files(files):
+            """Budgeted preview of each file while its full extraction starts in the pool"""
+            if not files:
+                yield {
+                    status_box: "## Status: No files selected",
+                    preview_box: ""
+                }
+                return
+            
+            paths = [file_info.name for file_info in files if validate_file(file_info.name)[0]]
+            outputs = []
+            truncated_count = 0
+            scheduled = False
+            for position, file_path in enumerate(paths, 1):
+                filename = Path(file_path).name
+                try:
+                    text, truncated = extract_preview(file_path)
+                    truncated_count += truncated
+                    outputs.append(f"=== {filename} ===\n{text}\n")
+                except Exception as e:
+                    logger.error(f"Preview error for {filename}: {str(e)}")
+                # Each preview is shown as soon as it is built
+                yield {
+                    status_box: f"## Status: Previewed {position} of {len(paths)} ({truncated_count} truncated) — extracting full text…",
+                    preview_box: "\n\n".join(outputs)
+                }
+                if not scheduled:
+                    # Hashing and cost estimation wait until the first preview is out;
+                    # process_files picks the full extractions up from _inflight
+                    schedule_extractions([(path, upload_hash(path)) for path in paths])
+                    scheduled = True
+            
+            if not paths:
+                yield {
+                    status_box: "## Status: No valid files to preview",
+                    preview_box: ""
+                }
+
+        def speculate_uploads(files):
+            if not files or not SPECULATIVE_EXTRACTION:
+                return gr.update()
+            started = speculate_extractions([file_info.name for file_info in files])
+            return f"## Status: {len(files)} files ready — {started} started extracting in the background"
+
+        def clear_all(files):
+            if files:
+                cancel_speculation([file_info.name for file_info in files])
+            return [None, "## Status: Ready", "", ""]
+
         def save_text_content(text, filename):
             if not text:
                 return "⚠️ Nothing to save - please extract text first"
@@ -480,14 +3802,74 @@ def create_ui():
             result = save_all_text(text, custom_filename)
             return f"📄 {result}"
 
+        def submit_background_job(files):
+            if not files:
+                return "", "## Status: No files selected"
+            job_id = submit_job([file_info.name for file_info in files])
+            return job_id, f"## Status: Job `{job_id}` queued with {len(files)} files — track it in the Jobs tab"
+
+        def poll_job(job_id):
+            job_id = (job_id or "").strip()
+            status = job_status(job_id) if job_id else None
+            if status is None:
+                return "⚠️ Unknown job ID", ""
+            lines = [f"**{status['done'] + status['failed']}/{status['total']} finished** — "
+                     f"{status['done']} done, {status['failed']} failed, "
+                     f"{status['running']} running, {status['pending']} pending"]
+            for task in status["tasks"]:
+                icon = {"done": "✅", "failed": "❌", "running": "⏳", "pending": "🕒"}[task["status"]]
+                line = f"- {icon} `{task['name']}`"
+                if task["note"]:
+                    line += f" — {' '.join(task['note'].split())}"
+                lines.append(line)
+            return "\n".join(lines), job_results(job_id)
+
+        def run_search(query):
+            start = time.perf_counter()
+            hits = search_index(query)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if not hits:
+                return f"No matches ({elapsed_ms:.1f} ms)"
+            lines = [f"**{len(hits)} matches** ({elapsed_ms:.1f} ms)"]
+            for name, kind, segment, snippet, _ in hits:
+                lines.append(f"- `{name}` — {kind} {segment}: {' '.join(snippet.split())}")
+            return "\n".join(lines)
+
+        def run_similar(query, k):
+            if not query or not query.strip():
+                return "⚠️ Enter some text to compare against"
+            start = time.perf_counter()
+            hits = find_similar(query, int(k))
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if not hits:
+                return f"No similar passages ({elapsed_ms:.1f} ms)"
+            lines = [f"**{len(hits)} similar passages** ({elapsed_ms:.1f} ms)"]
+            for score, meta in hits:
+                preview = ' '.join(meta['preview'].split())
+                lines.append(f"- `{meta['source']}` — {meta['kind']} {meta['segment']} ({score:.3f}): {preview}")
+            return "\n".join(lines)
+
         extract_btn.click(
             process_files,
+            inputs=[file_input, collapse_duplicates],
+            outputs=[status_box, preview_box]
+        )
+
+        preview_btn.click(
+            preview_files,
             inputs=file_input,
             outputs=[status_box, preview_box]
+        ).then(
+            process_files,
+            inputs=[file_input, collapse_duplicates],
+            outputs=[status_box, preview_box]
         )
 
+        file_input.upload(speculate_uploads, inputs=file_input, outputs=status_box)
+
         clear_btn.click(
-            lambda: [None, "## Status: Ready", "", ""],
+            clear_all,
+            inputs=file_input,
             outputs=[file_input, status_box, preview_box, save_status]
         )
         
@@ -497,11 +3879,131 @@ def create_ui():
             outputs=save_status
         )
 
+        job_btn.click(submit_background_job, inputs=file_input, outputs=[job_id_box, status_box])
+        poll_btn.click(poll_job, inputs=job_id_box, outputs=[job_status_box, job_results_box])
+        job_id_box.submit(poll_job, inputs=job_id_box, outputs=[job_status_box, job_results_box])
+
+        search_btn.click(run_search, inputs=search_query, outputs=search_results)
+        search_query.submit(run_search, inputs=search_query, outputs=search_results)
+
+        similar_btn.click(run_similar, inputs=[similar_query, similar_k], outputs=similar_results)
+
     return demo
 
 # ======================
 # Application Launch
 # ======================
 if __name__ == "__main__":
-    ui = create_ui()
-    ui.launch()
+    parser = argparse.ArgumentParser(description="File Text Extractor")
+    parser.add_argument("--benchmark-langchain", metavar="FILE",
+                        help="Compare load() and lazy_load() for the LangChain fallback and exit")
+    parser.add_argument("--langchain-strategy", choices=["auto", "fast", "hi_res", "ocr_only"],
+                        help="Partitioning strategy for the LangChain fallback")
+    parser.add_argument("--ocr-dpi", type=int, help=f"Rasterization DPI for OCR of scanned PDF pages (default {OCR_DPI})")
+    parser.add_argument("--trace-sample", type=float, metavar="RATE",
+                        help=f"Share of extractions (0-1) to trace into {TRACE_FILE} for chrome://tracing or Perfetto")
+    parser.add_argument("--normalize", action="store_true",
+                        help="Normalize extracted text (NFC, control characters, hyphenation, whitespace)")
+    parser.add_argument("--benchmark-normalize", metavar="FILE",
+                        help="Measure text normalization throughput on FILE's extracted text and exit")
+    parser.add_argument("--benchmark-workers", action="store_true",
+                        help="Measure worker process startup latency for each start method and exit")
+    parser.add_argument("--benchmark-input", metavar="FILE",
+                        help="Compare peak RSS of path vs memory-mapped input for one extraction and exit")
+    parser.add_argument("--calibrate-pdf", action="store_true",
+                        help="Benchmark the installed PDF backends on FILES, save the per-class policy and exit")
+    parser.add_argument("--chunks-out", metavar="JSONL",
+                        help="Write overlapping RAG chunks of FILES to this JSONL file and exit")
+    parser.add_argument("--segments-out", metavar="JSONL",
+                        help="Write the page/sheet/slide segments of FILES to this JSONL file and exit")
+    parser.add_argument("--segment", metavar="KIND:INDEX",
+                        help="Print one segment (e.g. page:12 or sheet:Sales) of each of FILES as JSON and exit")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--api-port", type=int, default=API_PORT,
+                        help="Port for the HTTP extraction API served next to the UI (0 disables it)")
+    parser.add_argument("--queue", metavar="DIR",
+                        help="Shared-filesystem work queue directory for --enqueue and --worker")
+    parser.add_argument("--enqueue", action="store_true", help="Add FILES to the --queue and exit")
+    parser.add_argument("--worker", action="store_true", help="Process tasks from the --queue")
+    parser.add_argument("--drain", action="store_true", help="With --worker, exit once the queue is empty")
+    parser.add_argument("--watch", metavar="DIR",
+                        help="Extract files as they are written into DIR (recursively) until interrupted")
+    parser.add_argument("--watch-output", metavar="DIR",
+                        help=f"Mirror --watch outputs under DIR instead of writing *{WATCH_OUTPUT_SUFFIX} next to inputs")
+    parser.add_argument("files", nargs="*", metavar="FILES")
+    args = parser.parse_args()
+
+    if args.langchain_strategy:
+        LANGCHAIN_STRATEGY = args.langchain_strategy
+    if args.ocr_dpi:
+        OCR_DPI = args.ocr_dpi
+    if args.normalize:
+        NORMALIZE_TEXT = True
+    if args.trace_sample is not None:
+        TRACE_SAMPLE_RATE = args.trace_sample
+    if args.watch:
+        # Watched files may be rewritten in place mid-extraction (see MMAP_INPUTS)
+        MMAP_INPUTS = False
+
+    if args.benchmark_langchain:
+        for label, stats in benchmark_langchain_loading(args.benchmark_langchain).items():
+            print(f"{label:>10}: {stats['seconds']:.3f}s, peak {stats['peak_bytes'] / 1024 / 1024:.1f} MiB, "
+                  f"{stats['chars']} chars")
+    elif args.benchmark_normalize:
+        sample, _ = extract_text(args.benchmark_normalize)
+        # Repeat small samples so timings are not dominated by call overhead
+        sample *= max(1, (8 * 1024 * 1024) // max(len(sample), 1))
+        for label, mb_per_second in benchmark_normalization(sample).items():
+            print(f"{label:>16}: {mb_per_second:8.1f} MB/s")
+    elif args.benchmark_workers:
+        for start_method, stats in benchmark_worker_startup().items():
+            print(f"{start_method:>10}: first worker {stats['first'] * 1000:8.1f} ms, "
+                  f"then {stats['median'] * 1000:8.1f} ms per worker (median)")
+    elif args.benchmark_input:
+        for label, stats in benchmark_input_mapping(args.benchmark_input).items():
+            print(f"{label:>5}: {stats['seconds']:.2f}s, peak RSS {stats['rss_before'] / 1048576:.0f} MiB before, "
+                  f"{stats['rss_after'] / 1048576:.0f} MiB after "
+                  f"(+{(stats['rss_after'] - stats['rss_before']) / 1048576:.0f} MiB), "
+                  f"heap peak {stats['heap_peak'] / 1048576:.0f} MiB, {stats['chars']} chars")
+    elif args.calibrate_pdf:
+        for doc_class, entry in calibrate_pdf_backends(args.files).items():
+            print(f"{doc_class}: using {entry['backend']}")
+            for name, stats in entry["backends"].items():
+                print(f"  {name:>9}: {stats['pages_per_second']:8.1f} pages/s, {stats['chars']} chars, "
+                      f"{stats['errors']} errors{'' if stats['acceptable'] else ' (rejected)'}")
+    elif args.enqueue or args.worker:
+        if not args.queue:
+            parser.error("--enqueue and --worker require --queue DIR")
+        if args.enqueue:
+            print(f"Enqueued {len(enqueue_files(args.queue, args.files))} tasks in {args.queue}")
+        if args.worker:
+            run_queue_worker(args.queue, exit_when_idle=args.drain)
+        print(", ".join(f"{state}: {count}" for state, count in queue_counts(args.queue).items()))
+    elif args.watch:
+        watcher = FolderWatcher(args.watch, args.watch_output)
+        # Service managers stop the daemon with SIGTERM; shut down as cleanly as on Ctrl+C
+        signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+    elif args.segments_out:
+        count = write_segments_jsonl(args.files, args.segments_out)
+        print(f"Wrote {count} segments to {args.segments_out}")
+    elif args.segment:
+        kind, _, index = args.segment.partition(":")
+        for filename in args.files:
+            segment = extract_segment(filename, kind, int(index) if index.isdigit() else index)
+            print(segment_to_json(segment) if segment else json.dumps({"source": filename, "error": f"no {args.segment}"}))
+    elif args.chunks_out:
+        count = write_chunks_jsonl(args.files, args.chunks_out, args.chunk_size, args.chunk_overlap)
+        print(f"Wrote {count} chunks to {args.chunks_out}")
+    else:
+        if args.api_port:
+            start_api_server(API_HOST, args.api_port)
+        if os.path.exists(JOB_DB_PATH):
+            # Resume tasks queued or interrupted before the last shutdown
+            start_job_workers()
+        ui = create_ui()
+        ui.launch()
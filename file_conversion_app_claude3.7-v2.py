@@ -1,9 +1,13 @@
 import os
+import argparse
 import gradio as gr
 import tempfile
 import shutil
-from typing import Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple
 import logging
+import threading
+import time
+import tracemalloc
 
 # Configure logging
 logging.basicConfig(
@@ -12,6 +16,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger("file_extractor")
 
+try:
+    import fcntl
+except ImportError:  # Windows: no reflink support
+    fcntl = None
+
 # Core libraries for basic file handling
 import json
 import csv
@@ -84,168 +93,444 @@ def validate_file_extension(filename: str) -> bool:
     return extension in allowed_extensions
 
 
-def extract_text_with_langchain(file_path: str) -> Optional[str]:
-    """Extract text using LangChain document loaders."""
-    if not LANGCHAIN_SUPPORT:
-        return None
-        
+# Files at or above this size are partitioned with unstructured's "fast" strategy
+LARGE_FILE_BYTES = 20 * 1024 * 1024
+
+
+def choose_partition_strategy(file_path: str) -> str:
+    """Pick the unstructured partitioning strategy for a file."""
+    return "fast" if os.path.getsize(file_path) >= LARGE_FILE_BYTES else "auto"
+
+
+def build_langchain_loader(file_path: str, strategy: Optional[str] = None):
+    """Create the LangChain loader for a file, or None if the extension has none."""
     _, extension = os.path.splitext(file_path.lower())
+    # Unstructured-based loaders emit one element at a time instead of one joined document
+    unstructured_kwargs = {
+        "mode": "elements",
+        "strategy": strategy or choose_partition_strategy(file_path)
+    }
     
-    try:
-        if extension == ".txt":
-            loader = TextLoader(file_path, encoding='utf-8')
-        elif extension == ".md":
-            loader = UnstructuredMarkdownLoader(file_path)
-        elif extension == ".json":
-            # Extract JSON content
-            def json_content_formatter(data: dict) -> str:
-                return json.dumps(data, indent=2)
-            
-            loader = JSONLoader(
-                file_path=file_path,
-                jq_schema=".",
-                content_formatter=json_content_formatter
-            )
-        elif extension == ".csv":
-            loader = CSVLoader(file_path)
-        elif extension == ".pdf":
-            loader = PyPDFLoader(file_path)
-        elif extension == ".docx":
-            loader = Docx2txtLoader(file_path)
-        elif extension == ".doc":
-            loader = UnstructuredWordDocumentLoader(file_path)
-        elif extension in [".xlsx", ".xls"]:
-            loader = UnstructuredExcelLoader(file_path)
-        elif extension in [".pptx", ".ppt"]:
-            loader = UnstructuredPowerPointLoader(file_path)
-        else:
-            return None
+    if extension == ".txt":
+        return TextLoader(file_path, encoding='utf-8')
+    elif extension == ".md":
+        return UnstructuredMarkdownLoader(file_path, **unstructured_kwargs)
+    elif extension == ".json":
+        # Extract JSON content
+        def json_content_formatter(data: dict) -> str:
+            return json.dumps(data, indent=2)
         
-        documents = loader.load()
-        return "\n\n".join([doc.page_content for doc in documents])
+        return JSONLoader(
+            file_path=file_path,
+            jq_schema=".",
+            content_formatter=json_content_formatter
+        )
+    elif extension == ".csv":
+        return CSVLoader(file_path)
+    elif extension == ".pdf":
+        return PyPDFLoader(file_path)
+    elif extension == ".docx":
+        return Docx2txtLoader(file_path)
+    elif extension == ".doc":
+        return UnstructuredWordDocumentLoader(file_path, **unstructured_kwargs)
+    elif extension in [".xlsx", ".xls"]:
+        return UnstructuredExcelLoader(file_path, **unstructured_kwargs)
+    elif extension in [".pptx", ".ppt"]:
+        return UnstructuredPowerPointLoader(file_path, **unstructured_kwargs)
+    return None
+
+
+def iter_text_with_langchain(file_path: str, strategy: Optional[str] = None) -> Iterator[str]:
+    """Yield text one document element at a time using the loader's lazy_load()."""
+    loader = build_langchain_loader(file_path, strategy)
+    if loader is None:
+        return
+    for doc in loader.lazy_load():
+        if doc.page_content and doc.page_content.strip():
+            yield doc.page_content
+
+
+def stream_text_with_langchain(file_path: str, writer: TextIO, strategy: Optional[str] = None) -> int:
+    """Write LangChain-extracted text element by element into a text stream.
     
-    except Exception as e:
-        logger.warning(f"LangChain extraction failed: {str(e)}")
-        return None
+    Elements are separated by blank lines, the layout load() produced in single mode.
+    Returns the number of characters written.
+    """
+    written = 0
+    for element_text in iter_text_with_langchain(file_path, strategy):
+        if written:
+            writer.write("\n\n")
+            written += 2
+        writer.write(element_text)
+        written += len(element_text)
+    return written
 
 
-def extract_text_fallback(file_path: str) -> str:
-    """Extract text using specialized libraries as fallback."""
+def benchmark_langchain_loading(file_path: str, strategy: Optional[str] = None,
+                                rounds: int = 4) -> Dict[str, Dict[str, float]]:
+    """Compare latency and peak Python heap of load() against lazy streaming.
+    
+    Both write their text to a temporary file, as process_files does. The two run in alternating order over `rounds` rounds, so neither always pays for
+    cold imports and caches; seconds are the median and peak_bytes the maximum per method.
+    """
+    if not LANGCHAIN_SUPPORT:
+        raise RuntimeError("LangChain is not installed")
+    if build_langchain_loader(file_path, strategy) is None:
+        raise ValueError(f"No LangChain loader for {os.path.splitext(file_path)[1]} files")
+    
+    def eager() -> int:
+        documents = build_langchain_loader(file_path, strategy).load()
+        text = "\n\n".join([doc.page_content for doc in documents if doc.page_content.strip()])
+        with tempfile.TemporaryFile('w', encoding='utf-8') as output:
+            return output.write(text)
+    
+    def lazy() -> int:
+        with tempfile.TemporaryFile('w', encoding='utf-8') as output:
+            return stream_text_with_langchain(file_path, output, strategy)
+    
+    methods = [("load", eager), ("lazy_load", lazy)]
+    samples: Dict[str, List[Tuple[float, int, int]]] = {label: [] for label, _ in methods}
+    for round_index in range(rounds):
+        for label, fn in (methods if round_index % 2 == 0 else methods[::-1]):
+            tracemalloc.start()
+            start_time = time.perf_counter()
+            chars = fn()
+            elapsed = time.perf_counter() - start_time
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            samples[label].append((elapsed, peak, chars))
+    
+    results = {}
+    for label, runs in samples.items():
+        seconds = sorted(elapsed for elapsed, _, _ in runs)
+        results[label] = {
+            "seconds": seconds[(len(seconds) - 1) // 2],
+            "peak_bytes": max(peak for _, peak, _ in runs),
+            "chars": runs[-1][2]
+        }
+    return results
+
+
+def write_text_with_langchain(file_path: str, writer: TextIO) -> int:
+    """Extract text using LangChain document loaders, streaming it into writer."""
+    if not LANGCHAIN_SUPPORT:
+        raise ExtractorUnavailable("LangChain is not installed")
+    return stream_text_with_langchain(file_path, writer)
+
+
+class ExtractorUnavailable(Exception):
+    """Raised when an extractor cannot handle a file type in this environment."""
+
+
+def write_text_native(file_path: str, writer: TextIO) -> int:
+    """Extract text using specialized libraries and write it out, returning characters written."""
+    text = extract_text_native(file_path)
+    if not is_acceptable_text(text):
+        return 0
+    return writer.write(text)
+
+
+def extract_text_native(file_path: str) -> str:
+    """Extract text using specialized libraries, raising on failure."""
     _, extension = os.path.splitext(file_path.lower())
     
-    try:
-        # Plain text files
-        if extension == ".txt":
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-                return file.read()
-        
-        # Markdown files        
-        elif extension == ".md":
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-                content = file.read()
-                if MARKDOWN_SUPPORT:
-                    return markdown2.markdown(content)
-                return content
-        
-        # JSON files        
-        elif extension == ".json":
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-                data = json.load(file)
-                return json.dumps(data, indent=2)
-        
-        # CSV files        
-        elif extension == ".csv":
-            text_lines = []
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-                reader = csv.reader(file)
-                for row in reader:
-                    text_lines.append(",".join(row))
-            return "\n".join(text_lines)
-        
-        # PDF files        
-        elif extension == ".pdf":
-            if PDF_SUPPORT:
-                text_parts = []
-                with open(file_path, 'rb') as file:
-                    reader = PyPDF2.PdfReader(file)
-                    for page_num in range(len(reader.pages)):
-                        page_text = reader.pages[page_num].extract_text()
-                        if page_text:
-                            text_parts.append(page_text)
-                return "\n\n".join(text_parts)
-            else:
-                return "PDF extraction requires PyPDF2 library."
+    # Plain text files
+    if extension == ".txt":
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            return file.read()
+    
+    # Markdown files        
+    elif extension == ".md":
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            content = file.read()
+            if MARKDOWN_SUPPORT:
+                return markdown2.markdown(content)
+            return content
+    
+    # JSON files        
+    elif extension == ".json":
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            data = json.load(file)
+            return json.dumps(data, indent=2)
+    
+    # CSV files        
+    elif extension == ".csv":
+        text_lines = []
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            reader = csv.reader(file)
+            for row in reader:
+                text_lines.append(",".join(row))
+        return "\n".join(text_lines)
+    
+    # PDF files        
+    elif extension == ".pdf":
+        if PDF_SUPPORT:
+            text_parts = []
+            with open(file_path, 'rb') as file:
+                reader = PyPDF2.PdfReader(file)
+                for page_num in range(len(reader.pages)):
+                    page_text = reader.pages[page_num].extract_text()
+                    if page_text:
+                        text_parts.append(page_text)
+            return "\n\n".join(text_parts)
+        else:
+            raise ExtractorUnavailable("PDF extraction requires PyPDF2 library.")
+    
+    # Word documents        
+    elif extension == ".docx":
+        if DOCX_SUPPORT:
+            doc = Document(file_path)
+            return "\n".join([para.text for para in doc.paragraphs])
+        else:
+            raise ExtractorUnavailable("DOCX extraction requires python-docx library.")
+    
+    # Excel files        
+    elif extension in [".xlsx", ".xls"]:
+        try:
+            df = pd.read_excel(file_path)
+            return df.to_string()
+        except Exception:
+            if EXCEL_SUPPORT and extension == ".xlsx":
+                wb = load_workbook(file_path)
+                text_lines = []
+                for sheet in wb:
+                    for row in sheet.iter_rows(values_only=True):
+                        text_lines.append("\t".join([str(cell) for cell in row if cell is not None]))
+                return "\n".join(text_lines)
+            raise
+    
+    # PowerPoint files        
+    elif extension == ".pptx":
+        if PPTX_SUPPORT:
+            prs = Presentation(file_path)
+            text_parts = []
+            for slide in prs.slides:
+                for shape in slide.shapes:
+                    if hasattr(shape, "text"):
+                        text_parts.append(shape.text)
+            return "\n\n".join(text_parts)
+        else:
+            raise ExtractorUnavailable("PPTX extraction requires python-pptx library.")
+    
+    # Legacy formats that might need specialized libraries        
+    elif extension in [".doc", ".ppt"]:
+        try:
+            import textract
+            return textract.process(file_path).decode('utf-8')
+        except ImportError:
+            raise ExtractorUnavailable(f"{extension.upper()} extraction requires textract library.")
+    
+    else:
+        raise ExtractorUnavailable(f"No fallback extraction method available for {extension} files.")
+
+
+# Per-format extractor statistics persist here so ordering adapts across runs
+STRATEGY_STATS_PATH = os.path.join(os.getcwd(), "extraction_strategy_stats.json")
+
+
+def is_acceptable_text(text: Optional[str]) -> bool:
+    """Quality check deciding whether an extractor's output is good enough to stop.
+    
+    Only empty output counts as a failure: a short file legitimately yields short text.
+    """
+    return bool(text) and bool(text.strip())
+
+
+class ExtractionStrategyEngine:
+    """Try the cheapest capable extractor per format first, escalating on empty output or errors.
+    
+    Extractors write their text into a stream and return the number of characters
+    written; zero means no acceptable text. Each extractor is registered with a prior
+    cost in seconds. Observed latency and
+    success rate per (extension, extractor) replace the prior once measured, so the
+    ordering adapts: expected cost = mean latency / smoothed success rate.
+    """
+    
+    def __init__(self, stats_path: Optional[str] = STRATEGY_STATS_PATH):
+        self.extractors: Dict[str, Tuple[Callable[[str, TextIO], int], float, set]] = {}
+        self.stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self.stats_path = stats_path
+        self._lock = threading.Lock()
+        self._load_stats()
+    
+    def register(self, name: str, extract_fn: Callable[[str, TextIO], int],
+                 prior_seconds: float, extensions: List[str]) -> None:
+        """Register an extractor with its prior cost and the extensions it can handle."""
+        self.extractors[name] = (extract_fn, prior_seconds, set(extensions))
+    
+    def _load_stats(self) -> None:
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                self.stats = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load strategy stats: {str(e)}")
+    
+    def save_stats(self) -> None:
+        """Persist observed statistics so later runs start with the learned ordering."""
+        if not self.stats_path:
+            return
+        with self._lock:
+            snapshot = json.dumps(self.stats, indent=2)
+        tmp_path = None
+        try:
+            # Write beside the target and rename, so a crash never leaves a truncated file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.stats_path)),
+                                            suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.stats_path)
+        except OSError as e:
+            logger.warning(f"Could not save strategy stats: {str(e)}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+    
+    def expected_cost(self, extension: str, name: str) -> float:
+        """Expected seconds to obtain acceptable text from this extractor."""
+        _, prior_seconds, _ = self.extractors[name]
+        entry = self.stats.get(extension, {}).get(name)
+        if not entry or not entry["attempts"]:
+            return prior_seconds
+        mean_seconds = entry["seconds"] / entry["attempts"]
+        success_rate = (entry["successes"] + 1) / (entry["attempts"] + 2)
+        return mean_seconds / success_rate
+    
+    def ranked(self, extension: str) -> List[str]:
+        """Capable extractors for an extension, cheapest expected cost first."""
+        capable = [name for name, (_, _, exts) in self.extractors.items() if extension in exts]
+        with self._lock:
+            return sorted(capable, key=lambda name: self.expected_cost(extension, name))
+    
+    def record(self, extension: str, name: str, success: bool, seconds: float) -> None:
+        with self._lock:
+            entry = self.stats.setdefault(extension, {}).setdefault(
+                name, {"attempts": 0, "successes": 0, "seconds": 0.0}
+            )
+            entry["attempts"] += 1
+            entry["successes"] += int(success)
+            entry["seconds"] += seconds
+    
+    def extract(self, file_path: str, output_path: str) -> Tuple[int, str]:
+        """Run extractors in cost order until one writes acceptable text to output_path.
         
-        # Word documents        
-        elif extension == ".docx":
-            if DOCX_SUPPORT:
-                doc = Document(file_path)
-                return "\n".join([para.text for para in doc.paragraphs])
-            else:
-                return "DOCX extraction requires python-docx library."
+        Each attempt writes to a temporary file beside output_path that only replaces
+        it on success, so a failed attempt never leaves partial text behind.
+        Returns (characters written, method), or (0, "") if every extractor failed.
+        """
+        _, extension = os.path.splitext(file_path.lower())
         
-        # Excel files        
-        elif extension in [".xlsx", ".xls"]:
+        for name in self.ranked(extension):
+            extract_fn = self.extractors[name][0]
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)),
+                                            suffix=".tmp")
+            start_time = time.perf_counter()
             try:
-                df = pd.read_excel(file_path)
-                return df.to_string()
+                with os.fdopen(fd, 'w', encoding='utf-8') as output:
+                    written = extract_fn(file_path, output)
+            except ExtractorUnavailable:
+                os.unlink(tmp_path)
+                continue
             except Exception as e:
-                if EXCEL_SUPPORT and extension == ".xlsx":
-                    wb = load_workbook(file_path)
-                    text_lines = []
-                    for sheet in wb:
-                        for row in sheet.iter_rows(values_only=True):
-                            text_lines.append("\t".join([str(cell) for cell in row if cell is not None]))
-                    return "\n".join(text_lines)
-                return f"Excel extraction error: {str(e)}"
-        
-        # PowerPoint files        
-        elif extension == ".pptx":
-            if PPTX_SUPPORT:
-                prs = Presentation(file_path)
-                text_parts = []
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text"):
-                            text_parts.append(shape.text)
-                return "\n\n".join(text_parts)
-            else:
-                return "PPTX extraction requires python-pptx library."
-        
-        # Legacy formats that might need specialized libraries        
-        elif extension in [".doc", ".ppt"]:
-            try:
-                import textract
-                return textract.process(file_path).decode('utf-8')
-            except ImportError:
-                return f"{extension.upper()} extraction requires textract library."
+                logger.warning(f"{name} extraction failed for {file_path}: {str(e)}")
+                written = 0
+            success = written > 0
+            self.record(extension, name, success, time.perf_counter() - start_time)
+            
+            if success:
+                os.replace(tmp_path, output_path)
+                return written, name
+            os.unlink(tmp_path)
+            logger.info(f"{name} produced no text for {file_path}, escalating")
         
-        else:
-            return f"No fallback extraction method available for {extension} files."
+        return 0, ""
+    
+    def format_report(self) -> str:
+        """Per-format success rates and mean latency for each extractor."""
+        lines = []
+        with self._lock:
+            for extension in sorted(self.stats):
+                for name, entry in sorted(self.stats[extension].items()):
+                    attempts = entry["attempts"] or 1
+                    lines.append(
+                        f"{extension} {name}: {entry['successes']}/{entry['attempts']} ok, "
+                        f"{entry['seconds'] / attempts:.3f}s avg"
+                    )
+        return "\n".join(lines)
+
+
+SUPPORTED_EXTENSIONS = [
+    ".txt", ".md", ".json", ".csv", ".pdf",
+    ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx"
+]
+
+strategy_engine = ExtractionStrategyEngine()
+# Priors only matter until real measurements exist: native libraries are cheap, LangChain is not
+strategy_engine.register("specialized libraries", write_text_native, 0.5, SUPPORTED_EXTENSIONS)
+if LANGCHAIN_SUPPORT:
+    strategy_engine.register("LangChain", write_text_with_langchain, 5.0, SUPPORTED_EXTENSIONS)
+
+
+# Extract from a private hardlink/reflink/copy of each upload instead of the upload itself;
+# set EXTRACTOR_INPUT_ISOLATION=1 to enable, or pass isolate_inputs to process_files
+INPUT_ISOLATION = os.environ.get("EXTRACTOR_INPUT_ISOLATION", "0") != "0"
+# Linux ioctl that makes the destination share the source's extents (reflink)
+FICLONE = 0x40049409
+
+
+def stage_input(source_path: str, work_dir: Optional[str]) -> Tuple[str, int]:
+    """Return the path to extract from and the number of bytes copied to get there.
     
-    except Exception as e:
-        return f"Extraction error: {str(e)}"
+    Without a work directory the uploaded file is used in place. Otherwise it is
+    hardlinked, then reflinked, and only copied when neither is possible (for
+    example when the work directory is on another filesystem).
+    """
+    if work_dir is None:
+        return source_path, 0
+    
+    # A private subdirectory per file keeps the original name (extractors key off
+    # the extension) while uploads sharing a basename can never collide.
+    target_path = os.path.join(tempfile.mkdtemp(dir=work_dir), os.path.basename(source_path))
+    try:
+        os.link(source_path, target_path)
+        return target_path, 0
+    except OSError:
+        pass
+    
+    if fcntl is not None:
+        try:
+            with open(source_path, 'rb') as src, open(target_path, 'xb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            shutil.copystat(source_path, target_path)
+            return target_path, 0
+        except OSError:
+            if os.path.exists(target_path):
+                os.unlink(target_path)
+    
+    shutil.copy2(source_path, target_path)
+    return target_path, os.path.getsize(target_path)
 
 
-def process_files(file_objs) -> Tuple[str, str]:
-    """Process multiple uploaded files and extract text content."""
+def process_files(file_objs, isolate_inputs: Optional[bool] = None) -> Tuple[str, str]:
+    """Process multiple uploaded files and extract text content.
+    
+    isolate_inputs overrides INPUT_ISOLATION for this call.
+    """
     if not file_objs:
         return "Error: No files uploaded.", ""
     
     all_results = []
     all_text_content = []
+    bytes_copied = 0
     
-    # Create a temporary working directory
-    temp_dir = tempfile.mkdtemp()
+    # Gradio has already written uploads to disk; only isolate them on request
+    if isolate_inputs is None:
+        isolate_inputs = INPUT_ISOLATION
+    temp_dir = tempfile.mkdtemp() if isolate_inputs else None
     
     try:
         for file_obj in file_objs:
-            # Get the original filename and create a working path
             original_filename = os.path.basename(file_obj.name)
-            temp_file_path = os.path.join(temp_dir, original_filename)
-            
-            # Copy the uploaded file to temp location
-            shutil.copy2(file_obj.name, temp_file_path)
             
             # Validate file type
             if not validate_file_extension(original_filename):
@@ -253,30 +538,23 @@ def process_files(file_objs) -> Tuple[str, str]:
                 all_results.append(f"Error: Unsupported file type '{file_ext}' for '{original_filename}'.")
                 continue
             
-            # Try extraction with LangChain first
-            text_content = None
-            method_used = ""
+            input_path, copied = stage_input(file_obj.name, temp_dir)
+            bytes_copied += copied
             
-            if LANGCHAIN_SUPPORT:
-                text_content = extract_text_with_langchain(temp_file_path)
-                if text_content:
-                    method_used = "LangChain"
+            output_filename = f"{os.path.splitext(original_filename)[0]}.txt"
+            output_path = os.path.join(os.getcwd(), output_filename)
             
-            # If LangChain failed or isn't available, use fallback methods
-            if text_content is None:
-                text_content = extract_text_fallback(temp_file_path)
-                method_used = "specialized libraries"
+            # Cheapest capable extractor first, escalating only on empty output or errors;
+            # the winner's text is written straight to the output file
+            chars_written, method_used = strategy_engine.extract(input_path, output_path)
             
-            if not text_content:
+            if not chars_written:
                 all_results.append(f"Error: Failed to extract text from '{original_filename}'.")
                 continue
             
-            # Save extracted text to a new file
-            output_filename = f"{os.path.splitext(original_filename)[0]}.txt"
-            output_path = os.path.join(os.getcwd(), output_filename)
-            
-            with open(output_path, 'w', encoding='utf-8') as file:
-                file.write(text_content)
+            # The preview shows the saved file as written
+            with open(output_path, 'r', encoding='utf-8') as file:
+                text_content = file.read()
             
             all_results.append(f"Text successfully extracted from '{original_filename}' using {method_used} and saved to '{output_filename}'.")
             all_text_content.append(f"### Content from {original_filename}:\n\n{text_content}")
@@ -286,8 +564,13 @@ def process_files(file_objs) -> Tuple[str, str]:
     
     finally:
         # Clean up temporary directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        logger.info(f"Input staging copied {bytes_copied} bytes for {len(file_objs)} file(s)")
+        strategy_engine.save_stats()
+        logger.info("Extraction strategy stats:\n" + strategy_engine.format_report())
     
+    all_results.append(f"Input staging: {bytes_copied} bytes copied.")
     combined_results = "\n".join(all_results)
     combined_text = "\n\n" + "-" * 80 + "\n\n".join(all_text_content)
     
@@ -654,5 +937,19 @@ def create_gradio_interface():
 
 
 if __name__ == "__main__":
-    app = create_gradio_interface()
-    app.launch()
+    parser = argparse.ArgumentParser(description="File Text Extractor")
+    parser.add_argument("--benchmark-langchain", metavar="FILE",
+                        help="Compare LangChain load() against lazy streaming on FILE and exit")
+    parser.add_argument("--strategy", choices=["auto", "fast", "hi_res", "ocr_only"],
+                        help="unstructured partitioning strategy for the benchmark")
+    parser.add_argument("--rounds", type=int, default=4, help="Benchmark rounds per method")
+    args = parser.parse_args()
+    
+    if args.benchmark_langchain:
+        results = benchmark_langchain_loading(args.benchmark_langchain, args.strategy, args.rounds)
+        for label, stats in results.items():
+            print(f"{label:>10}: {stats['seconds']:.3f}s, peak {stats['peak_bytes'] / 1024 / 1024:.1f} MiB, "
+                  f"{stats['chars']} chars")
+    else:
+        app = create_gradio_interface()
+        app.launch()
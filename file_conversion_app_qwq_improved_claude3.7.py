@@ -17,6 +17,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger("file_extractor")
 
+try:
+    import fcntl
+except ImportError:  # Windows: no reflink support
+    fcntl = None
+
 # Core libraries for basic file handling
 try:
     import PyPDF2
@@ -158,37 +163,69 @@ def extract_text_fallback(file_path: str) -> str:
     except Exception as e:
         return f"Extraction error: {str(e)}"
 
-def process_multiple_files(file_objs: List[gr.File]) -> Tuple[str, str]:
+# EXTRACTOR_INPUT_ISOLATION=1 extracts from a private link or copy of each upload
+INPUT_ISOLATION = os.environ.get("EXTRACTOR_INPUT_ISOLATION", "0") != "0"
+FICLONE = 0x40049409  # Linux ioctl request for a reflink
+
+def _reflink(source_path: str, target_path: str) -> None:
+    if fcntl is None:
+        raise OSError("reflinks need fcntl")
+    with open(source_path, 'rb') as src, open(target_path, 'xb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source_path, target_path)
+
+def stage_input(source_path: str, work_dir: Optional[str]) -> Tuple[str, int]:
+    """Give the extractor its own view of an upload, returning (path, bytes copied)"""
+    if work_dir is None:
+        return source_path, 0
+    # Fresh directory per upload: same basename (and extension), no collisions
+    target_path = os.path.join(tempfile.mkdtemp(dir=work_dir), os.path.basename(source_path))
+    for share in (os.link, _reflink):
+        try:
+            share(source_path, target_path)
+            return target_path, 0
+        except OSError:
+            if os.path.exists(target_path):
+                os.unlink(target_path)
+    shutil.copy2(source_path, target_path)
+    return target_path, os.path.getsize(target_path)
+
+def process_multiple_files(file_objs: List[gr.File], isolate_inputs: Optional[bool] = None) -> Tuple[str, str]:
     """Process multiple uploaded files and return aggregated results"""
     if not file_objs:
         return "Error: No files uploaded.", ""
     
-    temp_dir = tempfile.mkdtemp()
+    # Gradio has already written uploads to disk; only isolate them on request
+    if isolate_inputs is None:
+        isolate_inputs = INPUT_ISOLATION
+    temp_dir = tempfile.mkdtemp() if isolate_inputs else None
     status_messages = []
     all_text = []
+    bytes_copied = 0
     
     try:
         for file_obj in file_objs:
             original_filename = os.path.basename(file_obj.name)
-            temp_file_path = os.path.join(temp_dir, original_filename)
-            shutil.copy2(file_obj.name, temp_file_path)
             
             if not validate_file_extension(original_filename):
                 ext = os.path.splitext(original_filename)[1]
                 status_messages.append(f"❌ {original_filename}: Unsupported format '{ext}'")
                 continue
             
+            input_path, copied = stage_input(file_obj.name, temp_dir)
+            bytes_copied += copied
+            
             start_time = time.time()
             # Process individual file (original process_file logic inlined)
             text_content = None
             method_used = ""
             
             if LANGCHAIN_SUPPORT:
-                text_content = extract_text_with_langchain(temp_file_path)
+                text_content = extract_text_with_langchain(input_path)
                 method_used = "LangChain"
             
             if text_content is None:
-                text_content = extract_text_fallback(temp_file_path)
+                text_content = extract_text_fallback(input_path)
                 method_used = "fallback libraries"
             
             elapsed = time.time() - start_time
@@ -196,11 +233,14 @@ def process_multiple_files(file_objs: List[gr.File]) -> Tuple[str, str]:
             status_messages.append(f"✅ {original_filename}: {status}")
             all_text.append(f"--- {original_filename} ---\n{text_content}")
         
+        status_messages.append(f"Input staging: {bytes_copied} bytes copied")
         return "\n".join(status_messages), "\n\n".join(all_text)
     except Exception as e:
         return f"Critical error: {str(e)}", ""
     finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        logger.info(f"Input staging copied {bytes_copied} bytes for {len(file_objs)} file(s)")
 
 def create_gradio_interface():
     """Create enhanced Gradio interface with iOS-like styling"""
@@ -0,0 +1,28 @@
+"""Shared fixtures: file_conversion_app-v3.py is a script, so it is loaded here as a module"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "file_conversion_app-v3.py")
+
+
+@pytest.fixture(scope="session")
+def app():
+    # The module is not importable by name, so pool workers must inherit it by fork
+    os.environ.setdefault("EXTRACTOR_WORKER_START_METHOD", "fork")
+    spec = importlib.util.spec_from_file_location("file_conversion_app", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    yield module
+    if module._worker_pool is not None:
+        module._worker_pool.shutdown(cancel_futures=True)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in a temp directory: caches, indexes and outputs default to the working directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,85 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+
+def make_zip(path, members, compression=zipfile.ZIP_STORED):
+    with zipfile.ZipFile(path, "w", compression=compression) as zf:
+        for name, data in members:
+            if name.endswith("/"):
+                zf.writestr(zipfile.ZipInfo(name), b"")
+            else:
+                zf.writestr(name, data)
+    return str(path)
+
+
+def make_tar(path, members, mode="w"):
+    with tarfile.open(path, mode) as tf:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            if name.endswith("/"):
+                info.type = tarfile.DIRTYPE
+                tf.addfile(info)
+            else:
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+def members(app, path):
+    return [(name, skip) for name, _, skip in app.iter_archive_members(path)]
+
+
+@pytest.fixture
+def limits(app, monkeypatch):
+    def set_limits(members=1000, total_bytes=1024 * 1024, ratio=100):
+        monkeypatch.setattr(app, "MAX_ARCHIVE_MEMBERS", members)
+        monkeypatch.setattr(app, "MAX_ARCHIVE_TOTAL_BYTES", total_bytes)
+        monkeypatch.setattr(app, "MAX_COMPRESSION_RATIO", ratio)
+    return set_limits
+
+
+def test_members_within_limits(app, limits, tmp_path):
+    limits(members=3)
+    path = make_zip(tmp_path / "ok.zip", [("docs/", b""), ("a.txt", b"alpha"), ("b.exe", b"MZ")])
+    assert members(app, path) == [("a.txt", ""), ("b.exe", "unsupported member type")]
+
+
+@pytest.mark.parametrize("make, suffix", [(make_zip, "zip"), (make_tar, "tar")])
+def test_every_entry_counts_toward_member_limit(app, limits, tmp_path, make, suffix):
+    # Directories and unsupported members are never extracted but still count
+    limits(members=3)
+    path = make(tmp_path / f"many.{suffix}", [("d1/", b""), ("d2/", b""), ("x.exe", b"MZ"), ("a.txt", b"alpha")])
+    with pytest.raises(app.ArchiveLimitError, match="more than 3 members"):
+        members(app, path)
+
+
+@pytest.mark.parametrize("make, suffix", [(make_zip, "zip"), (make_tar, "tar")])
+def test_total_uncompressed_bytes(app, limits, tmp_path, make, suffix):
+    limits(total_bytes=1000, ratio=1000)
+    path = make(tmp_path / f"big.{suffix}", [("a.txt", b"a" * 600), ("b.txt", b"b" * 600)])
+    with pytest.raises(app.ArchiveLimitError, match="uncompressed size exceeds 1000 bytes"):
+        members(app, path)
+
+
+def test_zip_compression_ratio(app, limits, tmp_path):
+    limits(ratio=50)
+    path = make_zip(tmp_path / "bomb.zip", [("a.txt", b"a" * 500_000)], zipfile.ZIP_DEFLATED)
+    with pytest.raises(app.ArchiveLimitError, match="compression ratio exceeds 50"):
+        members(app, path)
+
+
+def test_tar_compression_ratio_is_checked_against_the_archive(app, limits, tmp_path):
+    limits(ratio=50)
+    path = make_tar(tmp_path / "bomb.tar.gz", [("a.txt", b"a" * 500_000)], mode="w:gz")
+    with pytest.raises(app.ArchiveLimitError, match="compression ratio exceeds 50"):
+        members(app, path)
+
+
+def test_rejected_archive_is_reported(app, limits, tmp_path):
+    limits(members=2)
+    path = make_zip(tmp_path / "many.zip", [("a.txt", b"alpha"), ("b.txt", b"beta"), ("c.txt", b"gamma")])
+    _, report = app.extract_text_from_archive(path)
+    assert "⛔ Archive rejected: more than 2 members" in report
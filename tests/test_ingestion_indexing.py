@@ -0,0 +1,58 @@
+"""Every ingestion path, not just the UI, feeds the search, vector and near-duplicate indexes"""
+import json
+import urllib.request
+
+import pytest
+
+TEXT = "Quarterly zeppelin maintenance schedule for the northern hangar and its ground crew.\n"
+
+
+@pytest.fixture
+def indexes(app, workdir, monkeypatch):
+    """Fresh indexes and caches; the indexes default to paths in the working directory"""
+    monkeypatch.setattr(app, "INDEX_DB_PATH", str(workdir / "index.sqlite3"))
+    monkeypatch.setattr(app, "_index_conn", None)
+    monkeypatch.setattr(app, "_vector_index", None)
+    monkeypatch.setattr(app, "_result_cache", app.OrderedDict())
+    monkeypatch.setattr(app, "_result_cache_bytes", 0)
+    source = workdir / "hangar.txt"
+    source.write_text(TEXT, encoding="utf-8")
+    yield str(source)
+    if app._index_conn is not None:
+        app._index_conn.close()
+
+
+def assert_indexed(app, name):
+    assert [hit[0] for hit in app.search_index("zeppelin")] == [name]
+    assert app.find_similar("zeppelin hangar schedule", k=1)[0][1]["source"] == name
+    # Registered for near-duplicate detection: a re-upload under another hash matches it
+    assert app.check_near_duplicate("again.txt", "other-hash", TEXT, register=False)[0] == name
+
+
+def test_watch_folder_indexes(app, indexes, workdir):
+    app.process_watched_file(indexes, str(workdir / "hangar.out.txt"))
+    assert (workdir / "hangar.out.txt").read_text(encoding="utf-8").strip() == TEXT.strip()
+    assert_indexed(app, "hangar.txt")
+
+
+def test_queue_worker_indexes(app, indexes, workdir):
+    queue_dir = str(workdir / "queue")
+    app.enqueue_files(queue_dir, [indexes])
+    assert app.process_queue_task(queue_dir, app.lease_task(queue_dir))
+    assert_indexed(app, "hangar.txt")
+
+
+def test_api_indexes(app, indexes, workdir, monkeypatch):
+    monkeypatch.setattr(app, "API_PATH_ROOT", str(workdir))
+    server = app.start_api_server(port=0)
+    try:
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{server.server_address[1]}/extract",
+            data=json.dumps({"paths": [indexes]}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=60) as response:
+            assert "zeppelin" in response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+    assert_indexed(app, "hangar.txt")
@@ -0,0 +1,59 @@
+import pytest
+
+BASE = " ".join(f"paragraph {i} of the quarterly report covers revenue growth in region {i}."
+                for i in range(40))
+
+
+@pytest.fixture
+def index(app, workdir, monkeypatch):
+    """A fresh SQLite index in the temp directory"""
+    monkeypatch.setattr(app, "INDEX_DB_PATH", str(workdir / "index.sqlite3"))
+    monkeypatch.setattr(app, "_index_conn", None)
+    yield app
+    if app._index_conn is not None:
+        app._index_conn.close()
+
+
+def registered(app):
+    conn = app.get_index_connection()
+    app._ensure_minhash_tables(conn)
+    return conn.execute("SELECT COUNT(*) FROM minhash_signatures").fetchone()[0]
+
+
+def test_edited_copy_is_near_duplicate(index):
+    assert index.check_near_duplicate("a.txt", "hash-a", BASE) is None
+    match = index.check_near_duplicate("b.txt", "hash-b", BASE.replace("region 7.", "region seven."))
+    assert match is not None
+    name, similarity = match
+    assert name == "a.txt"
+    assert index.NEAR_DUPLICATE_THRESHOLD <= similarity < 1.0
+
+
+def test_unrelated_text_is_not_duplicate(index):
+    index.check_near_duplicate("a.txt", "hash-a", BASE)
+    other = "Minutes of the garden committee: tomatoes, fencing and a new rota for watering duty."
+    assert index.check_near_duplicate("b.txt", "hash-b", other) is None
+
+
+def test_same_bytes_are_not_their_own_duplicate(index):
+    index.check_near_duplicate("a.txt", "hash-a", BASE)
+    assert index.check_near_duplicate("a copy.txt", "hash-a", BASE) is None
+
+
+@pytest.mark.parametrize("text", ["", "   ", "\n\t\n"])
+def test_empty_text_is_never_a_duplicate(index, text):
+    assert index.check_near_duplicate("empty1.txt", "hash-1", text) is None
+    assert index.check_near_duplicate("empty2.txt", "hash-2", text) is None
+    assert registered(index) == 0
+
+
+def test_short_text_is_shingled(index):
+    assert len(index.shingle_hashes("two words")) == 1
+    index.check_near_duplicate("short.txt", "hash-1", "two words")
+    assert index.check_near_duplicate("again.txt", "hash-2", "Two  words") == ("short.txt", 1.0)
+    assert index.check_near_duplicate("other.txt", "hash-3", "other words") is None
+
+
+def test_register_false_stores_nothing(index):
+    index.check_near_duplicate("a.txt", "hash-a", BASE, register=False)
+    assert registered(index) == 0
@@ -0,0 +1,45 @@
+import pytest
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("a\nb", "a\nb"),
+    ("a\r\nb", "a\nb"),
+    ("a\rb", "a\nb"),
+    ("a\n\nb", "a\n\nb"),
+    ("a\r\n\r\nb", "a\n\nb"),
+    ("a\r\rb", "a\n\nb"),
+    ("a \r\n  \r\n b", "a\n\nb"),
+    ("a\n\n\n\nb", "a\n\nb"),
+    ("one\r\ntwo\r\nthree", "one\ntwo\nthree"),
+])
+def test_line_and_paragraph_breaks(app, text, expected):
+    assert app.TextNormalizer()(text) == expected
+
+
+def test_crlf_matches_lf(app):
+    normalizer = app.TextNormalizer()
+    text = "first line\nsecond line\n\nnew paragraph  with   spaces\n"
+    assert normalizer(text.replace("\n", "\r\n")) == normalizer(text)
+
+
+def test_dehyphenation(app):
+    normalizer = app.TextNormalizer()
+    assert normalizer("exam-\nple") == "example"
+    assert normalizer("exam-\r\nple") == "example"
+    # A capital after the break is a real hyphen
+    assert normalizer("Jean-\nPaul") == "Jean-\nPaul"
+
+
+def test_controls_and_format_characters(app):
+    assert app.TextNormalizer()("﻿a\x00b​c­d") == "abcd"
+
+
+def test_whitespace_lines(app):
+    normalizer = app.TextNormalizer(form=None, strip_controls=False, dehyphenate=False, whitespace="lines")
+    assert normalizer("  a  \n\n\n  b\r\n") == "a\nb"
+
+
+def test_benchmark_steps_agree(app):
+    text = "Intro-\nduction\r\n\r\n\tcolumns   apart\x0c﻿end\n" * 50
+    results = app.benchmark_normalization(text, repeat=1)
+    assert set(results) == {"fused", "separate passes"}
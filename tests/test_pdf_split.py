@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "data", "sample.pdf")
+
+
+@pytest.fixture
+def fresh_pool(app, workdir, monkeypatch):
+    """A private pool and empty caches, so every extraction really runs"""
+    monkeypatch.setattr(app, "PAGE_CACHE_DB_PATH", "")
+    monkeypatch.setattr(app, "_result_cache", app.OrderedDict())
+    monkeypatch.setattr(app, "_result_cache_bytes", 0)
+
+    def start(**settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(app, name, value)
+        # Workers take their settings from the parent when the pool is created
+        pool = app.new_worker_pool(2)
+        monkeypatch.setattr(app, "_worker_pool", pool)
+        return pool
+
+    pools = []
+    yield lambda **settings: pools.append(start(**settings)) or pools[-1]
+    for pool in pools:
+        pool.shutdown(cancel_futures=True)
+
+
+@pytest.mark.parametrize("normalize", [False, True])
+def test_split_pdf_matches_unsplit(app, fresh_pool, monkeypatch, normalize):
+    fresh_pool(NORMALIZE_TEXT=normalize, PDF_SPLIT_PAGES=2)
+    expected_segments = []
+    expected_text, _ = app.extract_text(SAMPLE_PDF, on_segment=lambda *segment: expected_segments.append(segment))
+
+    future = app._submit_pdf_split(SAMPLE_PDF, 6, False)
+    text, _, segments = future.result(timeout=60)
+
+    assert text == expected_text
+    assert segments == expected_segments
+    assert [index for _, index, _ in segments] == [1, 2, 3, 4, 5, 6]
+
+
+def test_split_pdf_is_normalized(app, fresh_pool):
+    fresh_pool(NORMALIZE_TEXT=True, PDF_SPLIT_PAGES=2)
+    text, _, _ = app._submit_pdf_split(SAMPLE_PDF, 6, False).result(timeout=60)
+    assert "introduction with extra spaces" in text
+    assert "   " not in text
+
+
+def test_page_cache_note_only_reports_reuse(app):
+    assert "Page cache" not in app.page_cache_note({"hits": 0, "misses": 6})
+    assert "Page cache: 2/6 pages reused (33%)" in app.page_cache_note({"hits": 2, "misses": 4})